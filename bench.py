@@ -0,0 +1,226 @@
+"""
+Micro-benchmarks for printlink hot paths.
+
+Usage:
+    python bench.py encoder [--size-kb 256] [--items western|mixed] [--repeat 5]
+    python bench.py raster [--width 1200] [--height 1800] [--workers 3] [--concurrency 1,2,4,8]
+"""
+import argparse
+import base64
+import concurrent.futures
+import functools
+import io
+import multiprocessing
+import random
+import threading
+import time
+
+try:
+    import win32print  # noqa: F401
+except ImportError:
+    import fake_spooler  # Benchmarks never print; the simulated spooler lets them run anywhere
+    fake_spooler.install()
+
+import printlink
+
+
+def timed(fn, repeat):
+    """Best wall time of `repeat` runs"""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ===========================================
+# 🔹 Code-page text encoder
+# ===========================================
+@functools.lru_cache(maxsize=None)
+def naive_tables(codepages):
+    tables = {}
+    for page in codepages:
+        table = {}
+        for byte in range(0x80, 0x100):
+            try:
+                table[bytes([byte]).decode(page)] = byte
+            except UnicodeDecodeError:
+                pass
+        tables[page] = table
+    return tables
+
+
+def naive_encode(text, codepages):
+    """Per-character lookup, the baseline the table-driven encoder replaces"""
+    tables = naive_tables(codepages)
+    out = bytearray()
+    page = None
+    for ch in text:
+        if ord(ch) < 0x80:
+            out.append(ord(ch))
+        elif page is not None and ch in tables[page]:
+            out.append(tables[page][ch])
+        else:
+            for candidate in codepages:
+                if ch in tables[candidate]:
+                    out += b"\x1b\x74" + bytes([printlink.ESCPOS_CODEPAGES[candidate]])
+                    page = candidate
+                    out.append(tables[candidate][ch])
+                    break
+            else:
+                out += b"?"
+    return bytes(out)
+
+
+def decode_escpos(data):
+    """Printed text of encoder output, for checking two encoders agree"""
+    names = {n: page for page, n in printlink.ESCPOS_CODEPAGES.items()}
+    page = "ascii"
+    text = []
+    for i, part in enumerate(data.split(b"\x1bt")):
+        if i:
+            page, part = names[part[0]], part[1:]
+        text.append(part.decode(page))
+    return "".join(text)
+
+
+SAMPLE_ITEMS = {
+    "western": ["Café au lait", "Crème brûlée", "Jalapeño", "Smørrebrød", "Gâteau", "Piña colada",
+                "Espresso", "Bagel", "Müsli", "Çay"],
+    "mixed": ["Café au lait", "Crème brûlée", "Борщ", "Пельмени", "Pierogi z mięsem", "Gulyás",
+              "Espresso", "Bagel", "Smørrebrød", "Čevapi"],
+}
+
+
+def sample_report(size_kb, items="western"):
+    """A large text report: repeated headers/rules plus item lines with accents and currency"""
+    random.seed(42)
+    items = SAMPLE_ITEMS[items]
+    lines = []
+    size = 0
+    while size < size_kb * 1024:
+        if len(lines) % 40 == 0:
+            lines += ["=" * 42, "Señor Café — Daily Sales Report", "=" * 42]
+        line = f"{random.choice(items):<28}{random.randint(1, 9):>3} x €{random.randint(100, 9999) / 100:>7.2f}"
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def bench_encoder(args):
+    text = sample_report(args.size_kb, args.items)
+    pages = printlink.DEFAULT_CODEPAGES
+    naive = naive_encode(text, pages)
+    table = printlink.encode_escpos_text(text, pages)
+    if decode_escpos(naive) != decode_escpos(table):
+        print("⚠️ Encoders disagree on the printed text")
+    switch = b"\x1bt"
+    print(f"ESC t switches: naive {naive.count(switch)}, table-driven {table.count(switch)}")
+
+    lines = text.splitlines(keepends=True)
+
+    def per_line():
+        for line in lines:
+            printlink.encode_escpos_text(line, pages)
+
+    results = [
+        ("naive per-character", timed(lambda: naive_encode(text, pages), args.repeat)),
+        ("table-driven, whole report", timed(lambda: printlink.encode_escpos_text(text, pages), args.repeat)),
+        ("naive, line by line", timed(lambda: [naive_encode(line, pages) for line in lines], args.repeat)),
+        ("table-driven, line by line", timed(per_line, args.repeat)),
+    ]
+    mb = len(text.encode("utf-8")) / 1e6
+    print(f"Encoding a {args.size_kb} KB report ({len(lines)} lines), best of {args.repeat}:")
+    for name, seconds in results:
+        print(f"   {name:<28} {seconds * 1000:8.2f} ms  {mb / seconds:8.1f} MB/s  x{results[0][1] / seconds:5.1f}")
+
+
+# ===========================================
+# 🔹 Raster conversion: in-thread vs process pool
+# ===========================================
+def sample_image(width, height):
+    """A photo-like PNG (gradient plus noise) as base64, the worst case for dithering"""
+    from PIL import Image
+    im = Image.merge("RGB", [Image.linear_gradient("L").resize((width, height)),
+                             Image.effect_noise((width, height), 64),
+                             Image.radial_gradient("L").resize((width, height))])
+    buf = io.BytesIO()
+    im.save(buf, "PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+class GilProbe:
+    """Measures how late a 5 ms sleep wakes up: a stand-in for a light request
+    (/printers, /api/status) sharing the interpreter with the conversions"""
+    def __init__(self):
+        self.delays = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            t = time.perf_counter()
+            time.sleep(0.005)
+            self.delays.append(time.perf_counter() - t - 0.005)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        delays = sorted(self.delays)
+        return delays[int(len(delays) * 0.95)] * 1000 if delays else 0.0
+
+
+def bench_raster(args):
+    img = sample_image(args.width, args.height)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    pool = concurrent.futures.ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+    print(f"Rasterising a {args.width}x{args.height} image, {args.jobs} jobs per client, "
+          f"pool of {args.workers} worker(s), {multiprocessing.cpu_count()} CPU(s):")
+    print(f"   {'mode':<14}{'clients':>8}{'jobs/s':>10}{'x':>7}{'probe p95 ms':>14}")
+    try:
+        for label, setting in (("in-thread", False), ("process pool", pool)):
+            printlink.raster_pool = setting
+            printlink.image_to_escpos_bytes(img)  # Warm up (starts the workers)
+            baseline = None
+            for clients in levels:
+                jobs = args.jobs * clients
+                probe = GilProbe()
+                t = time.perf_counter()
+                with concurrent.futures.ThreadPoolExecutor(clients) as threads:
+                    list(threads.map(lambda _: printlink.image_to_escpos_bytes(img), range(jobs)))
+                rate = jobs / (time.perf_counter() - t)
+                baseline = baseline or rate
+                print(f"   {label:<14}{clients:>8}{rate:>10.1f}{rate / baseline:>7.2f}{probe.stop():>14.1f}")
+    finally:
+        printlink.raster_pool = None
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="printlink micro-benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("encoder", help="code-page text encoder vs naive per-character encoding")
+    p.add_argument("--size-kb", type=int, default=256)
+    p.add_argument("--items", choices=sorted(SAMPLE_ITEMS), default="western",
+                   help="western: one code page covers the report; mixed: frequent page switches")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_encoder)
+
+    p = sub.add_parser("raster", help="image rasterisation throughput, in-thread vs process pool")
+    p.add_argument("--width", type=int, default=1200)
+    p.add_argument("--height", type=int, default=1800)
+    p.add_argument("--workers", type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    p.add_argument("--concurrency", default="1,2,4,8", help="comma-separated client counts")
+    p.add_argument("--jobs", type=int, default=4, help="jobs per client at each level")
+    p.set_defaults(func=bench_raster)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+In-memory stand-ins for win32print, win32event, win32api, pywintypes and winreg.
+
+Lets printlink run on a machine without the Windows spooler, for load tests
+and development on Linux:
+
+    python printlink.py --fake-spooler
+
+Printers are simulated: each one prints a single document at a time at a fixed
+speed, and every spooler call costs a fixed latency. Configured through the
+environment:
+
+    FAKE_PRINTERS             Comma-separated printer names (default: Receipt,Kitchen,Bar,Label,Office)
+    FAKE_PRINTER_BPS          Printer speed in bytes/second, 0 for instant (default 20000)
+    FAKE_SPOOLER_LATENCY_MS   Latency of each spooler call (default 2)
+    FAKE_FAIL_PRINTERS        Comma-separated printers whose OpenPrinter fails
+    FAKE_CONFIG               JSON merged into the (in-memory) registry config,
+                              e.g. {"pools": "{\"bar\": [\"Bar\", \"Kitchen\"]}"}
+"""
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+PRINTER_ENUM_LOCAL = 2
+PRINTER_ENUM_CONNECTIONS = 4
+PRINTER_STATUS_OFFLINE = 0x80
+PRINTER_CHANGE_ADD_PRINTER = 0x1
+PRINTER_CHANGE_SET_PRINTER = 0x2
+PRINTER_CHANGE_DELETE_PRINTER = 0x4
+
+DEFAULT_PRINTERS = "Receipt,Kitchen,Bar,Label,Office"
+
+printers = {}             # name -> FakePrinter, in enumeration order
+default_printer = None
+lock = threading.Lock()
+bytes_per_second = 0
+latency = 0.0
+failing = set()
+change_handles = []       # Open change notifications; like Windows, default printer changes are not signalled
+
+
+class FakePrinter:
+    def __init__(self, name, port, driver="Generic / Text Only"):
+        self.name = name
+        self.port = port
+        self.driver = driver
+        self.status = 0
+        self.attributes = 0
+        self.busy = threading.Lock()  # One document at a time, like the real device
+        self.docs = 0
+        self.bytes = 0
+
+    def info(self):
+        return {
+            "pServerName": None, "pPrinterName": self.name, "pShareName": "", "pPortName": self.port,
+            "pDriverName": self.driver, "pComment": "Simulated printer", "pLocation": "",
+            "Status": self.status, "Attributes": self.attributes, "cJobs": 0
+        }
+
+    def feed(self, size):
+        """Simulate the printer consuming `size` bytes"""
+        if bytes_per_second:
+            time.sleep(size / bytes_per_second)
+        self.bytes += size
+
+
+def _spooler_call():
+    if latency:
+        time.sleep(latency)
+
+
+# ===========================================
+# 🔹 pywintypes
+# ===========================================
+class error(Exception):
+    """Mirrors pywintypes.error(winerror, funcname, strerror)"""
+    def __init__(self, winerror, funcname, strerror):
+        super().__init__(winerror, funcname, strerror)
+        self.winerror = winerror
+        self.funcname = funcname
+        self.strerror = strerror
+
+
+# ===========================================
+# 🔹 win32print
+# ===========================================
+class Handle:
+    def __init__(self, printer):
+        self.printer = printer
+        self.in_doc = False
+
+
+def EnumPrinters(flags, name=None, level=2):
+    _spooler_call()
+    with lock:
+        return [p.info() for p in printers.values()]
+
+
+def GetDefaultPrinter():
+    with lock:
+        return default_printer or ""
+
+
+def OpenPrinter(name, defaults=None):
+    _spooler_call()
+    if name is None:
+        return Handle(None)  # The local print server
+    with lock:
+        printer = printers.get(name)
+    if printer is None or name in failing:
+        raise error(1801, "OpenPrinter", "The printer name is invalid.")
+    return Handle(printer)
+
+
+def StartDocPrinter(handle, level, doc_info):
+    _spooler_call()
+    handle.printer.busy.acquire()
+    handle.in_doc = True
+    handle.printer.docs += 1
+    return handle.printer.docs
+
+
+def StartPagePrinter(handle):
+    pass
+
+
+def WritePrinter(handle, data):
+    handle.printer.feed(len(data))
+    return len(data)
+
+
+def EndPagePrinter(handle):
+    pass
+
+
+def _end_doc(handle):
+    if handle.in_doc:
+        handle.in_doc = False
+        handle.printer.busy.release()
+
+
+def EndDocPrinter(handle):
+    _spooler_call()
+    _end_doc(handle)
+
+
+def AbortPrinter(handle):
+    _end_doc(handle)
+
+
+def ClosePrinter(handle):
+    _end_doc(handle)
+
+
+class ChangeHandle:
+    def __init__(self):
+        self.signalled = threading.Event()
+        self.changes = 0
+
+
+def FindFirstPrinterChangeNotification(handle, flags, options, notify_options):
+    change = ChangeHandle()
+    with lock:
+        change_handles.append(change)
+    return change
+
+
+def FindNextPrinterChangeNotification(change, options):
+    with lock:
+        flags, change.changes = change.changes, 0
+        change.signalled.clear()
+    return flags, None
+
+
+def FindClosePrinterChangeNotification(change):
+    with lock:
+        if change in change_handles:
+            change_handles.remove(change)
+
+
+def _notify(flag):
+    """Signal open change notifications (caller holds `lock`)"""
+    for change in change_handles:
+        change.changes |= flag
+        change.signalled.set()
+
+
+# ===========================================
+# 🔹 win32event
+# ===========================================
+WAIT_OBJECT_0 = 0
+WAIT_TIMEOUT = 258
+
+
+def WaitForSingleObject(handle, milliseconds):
+    return WAIT_OBJECT_0 if handle.signalled.wait(milliseconds / 1000) else WAIT_TIMEOUT
+
+
+# ===========================================
+# 🔹 win32api
+# ===========================================
+def ShellExecute(hwnd, verb, path, params, directory, show):
+    """The "printto" verb: the viewer reads the file and prints it in the background"""
+    _spooler_call()
+    name = params.strip('"')
+    with lock:
+        printer = printers.get(name)
+    if printer is None:
+        raise error(2, "ShellExecute", "The system cannot find the file specified.")
+    size = os.path.getsize(path)
+
+    def _print():
+        with printer.busy:
+            printer.docs += 1
+            printer.feed(size)
+
+    threading.Thread(target=_print, daemon=True).start()
+    return 42
+
+
+# ===========================================
+# 🔹 winreg (in-memory, so tests never touch real configuration)
+# ===========================================
+HKEY_CURRENT_USER = 0x80000001
+HKEY_LOCAL_MACHINE = 0x80000002
+KEY_READ = 0x20019
+KEY_WOW64_64KEY = 0x0100
+REG_SZ = 1
+
+registry = {}
+
+
+def OpenKey(root, path, reserved=0, access=KEY_READ):
+    if (root, path) not in registry:
+        raise FileNotFoundError(2, "The system cannot find the file specified")
+    return (root, path)
+
+
+def CreateKey(root, path):
+    registry.setdefault((root, path), {})
+    return (root, path)
+
+
+def QueryValueEx(key, name):
+    if name not in registry[key]:
+        raise FileNotFoundError(2, "The system cannot find the file specified")
+    return registry[key][name], REG_SZ
+
+
+def SetValueEx(key, name, reserved, kind, value):
+    registry[key][name] = value
+
+
+def CloseKey(key):
+    pass
+
+
+# ===========================================
+# 🔹 Simulation control
+# ===========================================
+def add_printer(name, port=None, driver="Generic / Text Only"):
+    global default_printer
+    with lock:
+        printers[name] = FakePrinter(name, port or f"USB{len(printers) + 1:03d}", driver)
+        if default_printer is None:
+            default_printer = name
+        _notify(PRINTER_CHANGE_ADD_PRINTER)
+
+
+def remove_printer(name):
+    global default_printer
+    with lock:
+        printers.pop(name, None)
+        if default_printer == name:
+            default_printer = next(iter(printers), None)
+        _notify(PRINTER_CHANGE_DELETE_PRINTER)
+
+
+def set_default_printer(name):
+    global default_printer
+    with lock:
+        default_printer = name
+
+
+def set_offline(name, offline=True):
+    with lock:
+        printers[name].status = PRINTER_STATUS_OFFLINE if offline else 0
+        _notify(PRINTER_CHANGE_SET_PRINTER)
+
+
+def stats():
+    """Documents and bytes printed per printer"""
+    with lock:
+        return {p.name: {"docs": p.docs, "bytes": p.bytes} for p in printers.values()}
+
+
+def install():
+    """Register the fakes as win32print, win32event, win32api, pywintypes and winreg"""
+    global bytes_per_second, latency, failing
+    bytes_per_second = int(os.environ.get("FAKE_PRINTER_BPS", "20000"))
+    latency = float(os.environ.get("FAKE_SPOOLER_LATENCY_MS", "2")) / 1000
+    failing = set(filter(None, os.environ.get("FAKE_FAIL_PRINTERS", "").split(",")))
+    for name in os.environ.get("FAKE_PRINTERS", DEFAULT_PRINTERS).split(","):
+        if name.strip():
+            add_printer(name.strip())
+
+    config = CreateKey(HKEY_CURRENT_USER, r"Software\PrintServer")
+    SetValueEx(config, "start_vortex", 0, REG_SZ, "false")
+    for name, value in json.loads(os.environ.get("FAKE_CONFIG") or "{}").items():
+        SetValueEx(config, name, 0, REG_SZ, str(value))
+    machine = CreateKey(HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Cryptography")
+    SetValueEx(machine, "MachineGuid", 0, REG_SZ, "00000000-fake-0000-0000-000000000000")
+
+    this = sys.modules[__name__]
+    for module_name, names in (
+        ("win32print", ["PRINTER_ENUM_LOCAL", "PRINTER_ENUM_CONNECTIONS", "EnumPrinters", "GetDefaultPrinter",
+                        "OpenPrinter", "StartDocPrinter", "StartPagePrinter", "WritePrinter",
+                        "EndPagePrinter", "EndDocPrinter", "AbortPrinter", "ClosePrinter",
+                        "FindFirstPrinterChangeNotification", "FindNextPrinterChangeNotification",
+                        "FindClosePrinterChangeNotification"]),
+        ("win32event", ["WAIT_OBJECT_0", "WAIT_TIMEOUT", "WaitForSingleObject"]),
+        ("win32api", ["ShellExecute"]),
+        ("pywintypes", ["error"]),
+        ("winreg", ["HKEY_CURRENT_USER", "HKEY_LOCAL_MACHINE", "KEY_READ", "KEY_WOW64_64KEY", "REG_SZ",
+                    "OpenKey", "CreateKey", "QueryValueEx", "SetValueEx", "CloseKey"]),
+    ):
+        module = types.ModuleType(module_name, f"Simulated {module_name} (fake_spooler)")
+        for name in names:
+            setattr(module, name, getattr(this, name))
+        sys.modules[module_name] = module
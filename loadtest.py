@@ -0,0 +1,302 @@
+"""
+Load generator for a running printlink service.
+
+Replays a weighted mix of /print jobs and reports throughput, latency
+percentiles and error rates. Against a real install it prints for real;
+for sizing runs start the service with simulated printers instead:
+
+    python printlink.py --fake-spooler
+    python loadtest.py --mix text=60,raw=20,logo_text=10,pdf=5,image=5 --concurrency 8 --duration 30
+
+or let the harness start and stop it:
+
+    python loadtest.py --spawn --printer-bps 20000 --spooler-latency-ms 2 --rate 50
+
+All clients share one address, so the server's per-client rate limit applies to
+the whole run; 429s in the report mean that limit was hit (raise it with the
+"limits" config value). --spawn lifts the per-client limit by default so the
+run measures the printers; pass --limits '{}' to keep the server defaults.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+MODES = ("text", "raw", "logo_text", "pdf", "image")
+SPAWN_LIMITS = {"client_rate": 1e6, "client_burst": 1e6}  # One address stands in for many clients
+
+
+# ===========================================
+# 🔹 Payloads
+# ===========================================
+def receipt_text(lines=25):
+    items = ["Café au lait", "Crème brûlée", "Jalapeño bagel", "Müsli", "Espresso", "Smørrebrød"]
+    out = ["Señor Café", "Order #1042", "-" * 32]
+    for i in range(lines):
+        out.append(f"{items[i % len(items)]:<22}{(i % 4) + 1:>2} x {3.5 + i % 7:>5.2f}")
+    out += ["-" * 32, f"{'TOTAL':<22}{lines * 4.75:>10.2f}", "Thank you!"]
+    return "\n".join(out)
+
+
+def raw_receipt():
+    body = receipt_text().encode("ascii", "replace")
+    return b"\x1b@\x1ba\x01\x1bE\x01LOAD TEST\x1bE\x00\n\x1ba\x00" + body + b"\n\n\n\x1dV\x00"
+
+
+def png_logo(width=384, height=120):
+    from PIL import Image, ImageDraw
+    im = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(im)
+    draw.rectangle((8, 8, width - 9, height - 9), outline=0, width=4)
+    draw.ellipse((24, 20, 104, 100), fill=0)
+    draw.text((130, 50), "PRINTLINK LOAD TEST", fill=0)
+    buf = io.BytesIO()
+    im.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def jpeg_photo(width=1600, height=1200):
+    from PIL import Image
+    im = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def pdf_document(pages=2):
+    """A minimal multi-page PDF with one line of text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        stream = f"BT /F1 24 Tf 72 720 Td (Load test page {page + 1}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def build_payloads():
+    """One request body (minus the printer) per mode, built once up front"""
+    b64 = lambda data: base64.b64encode(data).decode("ascii")
+    return {
+        "text": {"mode": "text", "data": receipt_text()},
+        "raw": {"mode": "raw", "data": b64(raw_receipt())},
+        "logo_text": {"mode": "logo_text", "data": receipt_text(), "logo": b64(png_logo())},
+        "pdf": {"mode": "pdf", "data": b64(pdf_document())},
+        "image": {"mode": "image", "data": b64(jpeg_photo())},
+    }
+
+
+def parse_mix(spec):
+    """'text=60,raw=20' -> {'text': 60.0, 'raw': 20.0}"""
+    mix = {}
+    for part in spec.split(","):
+        mode, _, weight = part.partition("=")
+        mode = mode.strip()
+        if mode not in MODES:
+            raise argparse.ArgumentTypeError(f"unknown mode '{mode}' (expected {', '.join(MODES)})")
+        try:
+            mix[mode] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight for '{mode}'")
+    return mix
+
+
+# ===========================================
+# 🔹 Load generation
+# ===========================================
+class Schedule:
+    """Hands out send times for a target rate shared by all workers (0 = as fast as possible)"""
+    def __init__(self, rate, deadline):
+        self.interval = 1.0 / rate if rate else 0
+        self.next = time.perf_counter()
+        self.deadline = deadline
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            if not self.interval:
+                now = time.perf_counter()
+                return now if now < self.deadline else None
+            at = self.next
+            self.next += self.interval
+        if at >= self.deadline:
+            return None
+        delay = at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return at
+
+
+def worker(args, payloads, printers, schedule, results, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    modes = list(args.mix)
+    weights = [args.mix[m] for m in modes]
+    url = args.url.rstrip("/") + "/print"
+    while True:
+        # With a target rate, latency is measured from the scheduled send time so a
+        # slow server cannot hide its queueing delay (coordinated omission)
+        scheduled = schedule.take()
+        if scheduled is None:
+            break
+        mode = rng.choices(modes, weights)[0]
+        body = dict(payloads[mode], printer=rng.choice(printers))
+        try:
+            r = session.post(url, json=body, timeout=args.timeout)
+            status = r.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        results.append((mode, status, time.perf_counter() - scheduled))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+def summarize(results, elapsed):
+    by_mode = {mode: [] for mode in MODES}
+    for mode, status, seconds in results:
+        by_mode.setdefault(mode, []).append((status, seconds))
+    by_mode["all"] = [(status, seconds) for _, status, seconds in results]
+
+    summary = {"elapsed_s": round(elapsed, 3), "requests": len(results),
+               "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0,
+               "status": dict(Counter(str(status) for _, status, _ in results)), "modes": {}}
+    for mode, rows in by_mode.items():
+        if not rows and mode != "all":
+            continue
+        latencies = sorted(seconds * 1000 for _, seconds in rows)
+        errors = sum(1 for status, _ in rows if status != 200)
+        summary["modes"][mode] = {
+            "count": len(rows), "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0,
+        }
+    return summary
+
+
+def print_summary(summary, args):
+    print(f"\nRan {summary['elapsed_s']:.1f} s, concurrency {args.concurrency}, "
+          f"target rate {args.rate or 'unlimited'}{'/s' if args.rate else ''}")
+    all_modes = summary["modes"]["all"]
+    print(f"Requests: {summary['requests']} ({summary['throughput_rps']}/s), "
+          f"errors {all_modes['errors']} ({all_modes['error_rate'] * 100:.1f}%)")
+    print(f"   {'mode':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for mode, row in summary["modes"].items():
+        print(f"   {mode:<10}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    print("Status codes: " + ", ".join(f"{k} x{v}" for k, v in sorted(summary["status"].items())))
+
+
+# ===========================================
+# 🔹 Service under test
+# ===========================================
+def spawn_service(args):
+    """Start printlink with simulated printers and wait until it answers"""
+    config = json.loads(os.environ.get("FAKE_CONFIG") or "{}")
+    if args.limits:
+        config["limits"] = json.dumps(args.limits)
+    env = dict(os.environ, FAKE_PRINTER_BPS=str(args.printer_bps),
+               FAKE_SPOOLER_LATENCY_MS=str(args.spooler_latency_ms), FAKE_CONFIG=json.dumps(config))
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "printlink.py")
+    process = subprocess.Popen([sys.executable, script, "--fake-spooler"], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(args.url.rstrip("/") + "/api/status", timeout=1)
+            return process
+        except requests.RequestException:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    sys.exit("❌ printlink did not start")
+
+
+def discover_printers(args):
+    r = requests.get(args.url.rstrip("/") + "/printers", timeout=10)
+    r.raise_for_status()
+    return [p["Id"] for p in r.json()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a /print job mix against printlink")
+    parser.add_argument("--url", default="http://127.0.0.1:9100")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=60,raw=20,logo_text=10,pdf=5,image=5"),
+                        help="weighted job mix, e.g. text=60,raw=20,logo_text=10,pdf=5,image=5")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel client connections")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--rate", type=float, default=0, help="target jobs/second across all clients (0 = unlimited)")
+    parser.add_argument("--printer", action="append", help="printer Id or pool:<name> (default: every printer)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--spawn", action="store_true", help="start printlink --fake-spooler for the run")
+    parser.add_argument("--printer-bps", type=int, default=20000, help="with --spawn: simulated printer speed")
+    parser.add_argument("--spooler-latency-ms", type=float, default=2, help="with --spawn: simulated spooler latency")
+    parser.add_argument("--limits", type=json.loads, default=SPAWN_LIMITS,
+                        help="with --spawn: JSON admission limits for the service (default: no per-client limit)")
+    args = parser.parse_args()
+
+    process = spawn_service(args) if args.spawn else None
+    try:
+        printers = args.printer or discover_printers(args)
+        if not printers:
+            sys.exit("❌ No printers to target")
+        payloads = build_payloads()
+        print(f"🚀 {args.concurrency} clients, {args.duration:g} s, {len(printers)} printer(s), "
+              f"mix {', '.join(f'{m}={w:g}' for m, w in args.mix.items())}")
+
+        results = []  # list.append is atomic, so workers share it without a lock
+        t0 = time.perf_counter()
+        schedule = Schedule(args.rate, t0 + args.duration)
+        threads = [threading.Thread(target=worker, args=(args, payloads, printers, schedule, results, args.seed + i),
+                                    daemon=True) for i in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        summary = summarize(results, time.perf_counter() - t0)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,72 @@
-from flask import Flask, request, jsonify, render_template_string
-import win32print
-import win32api
-import tempfile
-import os
-import base64
-import requests
-import hashlib
-import struct
-import threading
-import time
-import subprocess
 import sys
-from datetime import datetime
-from PIL import Image, ImageOps
-import io
-import winreg
-import signal
-import atexit
-
-
-import socket
-import platform
-import getpass
-import uuid
-
-
+import time
+import contextlib
 
-app = Flask(__name__)
+# ===========================================
+# 🔹 Startup profiling (--startup-profile)
+# ===========================================
+STARTUP_PROFILE = "--startup-profile" in sys.argv
+FAKE_SPOOLER = "--fake-spooler" in sys.argv  # Simulated printers, see fake_spooler.py
+HTTP_PORT = int(sys.argv[sys.argv.index("--port") + 1]) if "--port" in sys.argv[:-1] else 9100
+startup_t0 = time.perf_counter()
+startup_phases = []
+
+@contextlib.contextmanager
+def startup_phase(name):
+    """Record how long an import or init phase took"""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases.append((name, time.perf_counter() - t))
+
+with startup_phase("import flask"):
+    from flask import Flask, Response, request, jsonify
+with startup_phase("import win32print"):
+    if FAKE_SPOOLER:
+        import fake_spooler
+        fake_spooler.install()
+    import win32print
+    import pywintypes
+with startup_phase("import stdlib"):
+    import tempfile
+    import os
+    import json
+    import base64
+    import gzip
+    import hashlib
+    import struct
+    import threading
+    import subprocess
+    from datetime import datetime
+    from collections import deque
+    import io
+    import itertools
+    import queue
+    import winreg
+    import signal
+    import atexit
+    import socket
+    import platform
+    import getpass
+    import uuid
+    import ctypes
+    import functools
+    import hmac
+    import re
+    import codecs
+    import binascii
+    import shutil
+    import multiprocessing
+    import concurrent.futures
+    from multiprocessing import shared_memory
+    from collections import Counter
+
+# PIL, requests and win32api are imported on first use to keep cold start short
+
+
+with startup_phase("create app"):
+    app = Flask(__name__)
 
 # ===========================================
 # 🔐 FIXED PASSWORD CONFIGURATION
@@ -46,7 +86,14 @@ def get_config():
         "host": "",
         "port": "",
         "email": "",
-        "start_vortex": "true"  # Default to true for backward compatibility
+        "start_vortex": "true",  # Default to true for backward compatibility
+        "pools": "",  # JSON: {"kitchen": ["<printer id or name>", ...]}
+        "debug_token": "",  # Allows /debug/* from other hosts via X-Debug-Token
+        "printer_profiles": "",  # JSON: {"<printer id, name or *>": {"codepages": ["cp437", "cp858"]}}
+        "limits": "",  # JSON overrides for ADMISSION_DEFAULTS, e.g. {"client_rate": 10}
+        "raster_workers": "",  # Image worker processes; empty = cores - 1 (max 4), 0 = in-thread
+        "peers": "",  # JSON list of other printlink instances, e.g. ["192.168.1.20:9100"]
+        "peer_discovery": ""  # "true": find other instances on the LAN by UDP broadcast
     }
     try:
         key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, REG_PATH, 0, winreg.KEY_READ)
@@ -84,36 +131,129 @@ def should_start_vortex():
     config = get_config()
     return config.get("start_vortex", "true").lower() == "true"
 
+# ===========================================
+# 🔹 Live event broadcaster (Server-Sent Events)
+# ===========================================
+STREAM_QUEUE_SIZE = 500          # Events buffered per client before it is dropped
+STREAM_KEEPALIVE_SECONDS = 15
+
+stream_subscribers = set()
+stream_subscribers_lock = threading.Lock()
+
+def publish_event(event, data):
+    """Format an event once and hand it to every connected stream.
+
+    Never blocks: a client whose queue is full is disconnected and
+    resynchronises from a fresh snapshot when its EventSource reconnects.
+    """
+    if not stream_subscribers:
+        return
+    message = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    with stream_subscribers_lock:
+        for q in list(stream_subscribers):
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                stream_subscribers.discard(q)
+
+def subscribe_events():
+    q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    with stream_subscribers_lock:
+        stream_subscribers.add(q)
+    return q
+
+def unsubscribe_events(q):
+    with stream_subscribers_lock:
+        stream_subscribers.discard(q)
+
 # ===========================================
 # 🔹 Vortex Status Tracking
 # ===========================================
+VORTEX_LOG_LINES = 2000      # Ring buffer size for captured vortex output
+VORTEX_STATUS_LINES = 50     # Lines included in /api/status and the status page
+VORTEX_LOG_MAX_LINE = 8192   # Longer lines are split
+
 vortex_status = {
     "running": False,
     "last_start": None,
     "last_error": None,
     "restart_count": 0,
-    "process_id": None,
-    "last_output": []
+    "process_id": None
 }
 
+vortex_output = deque(maxlen=VORTEX_LOG_LINES)
+vortex_output_seq = itertools.count(1)
+vortex_output_lock = threading.Lock()
+
 vortex_process = None
 flask_shutdown = False
 
+def append_vortex_output(line, stream="info"):
+    """Append a timestamped line to the vortex output ring buffer"""
+    with vortex_output_lock:
+        entry = {
+            "seq": next(vortex_output_seq),
+            "time": datetime.now().isoformat(),
+            "stream": stream,
+            "line": line
+        }
+        vortex_output.append(entry)
+    publish_event("log", entry)
+
+def recent_vortex_output(count=VORTEX_STATUS_LINES):
+    """Return the text of the last `count` captured lines"""
+    with vortex_output_lock:
+        start = max(0, len(vortex_output) - count)
+        return [e["line"] for e in itertools.islice(vortex_output, start, None)]
+
+def vortex_status_snapshot():
+    """Vortex status including the most recent output lines"""
+    return dict(vortex_status, last_output=recent_vortex_output())
+
 def update_vortex_status(running=None, error=None, pid=None, output=None):
-    """Update vortex status"""
+    """Update vortex status and publish the fields that changed"""
     global vortex_status
+    changes = {}
     if running is not None:
-        vortex_status["running"] = running
+        changes["running"] = running
         if running:
-            vortex_status["last_start"] = datetime.now().isoformat()
-            vortex_status["restart_count"] += 1
+            changes["last_start"] = datetime.now().isoformat()
+            changes["restart_count"] = vortex_status["restart_count"] + 1
     if error is not None:
-        vortex_status["last_error"] = error
+        changes["last_error"] = error
     if pid is not None:
-        vortex_status["process_id"] = pid
+        changes["process_id"] = pid
+    changes = {k: v for k, v in changes.items() if vortex_status.get(k) != v}
+    if changes:
+        vortex_status.update(changes)
+        publish_event("status", changes)
     if output is not None:
-        vortex_status["last_output"].append(output)
-        vortex_status["last_output"] = vortex_status["last_output"][-50:]
+        append_vortex_output(output)
+
+def _read_vortex_stream(pipe, stream):
+    """Drain one vortex pipe into the ring buffer until EOF.
+
+    The pipe is read continuously and appends never block, so vortex can
+    not stall on a full pipe no matter how much it writes.
+    """
+    try:
+        for raw in iter(lambda: pipe.readline(VORTEX_LOG_MAX_LINE), b""):
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if line:
+                append_vortex_output(line, stream)
+    except Exception:
+        pass
+    finally:
+        try:
+            pipe.close()
+        except Exception:
+            pass
+
+def start_vortex_readers(process):
+    """Start daemon reader threads for vortex stdout and stderr"""
+    for pipe, stream in ((process.stdout, "stdout"), (process.stderr, "stderr")):
+        if pipe is not None:
+            threading.Thread(target=_read_vortex_stream, args=(pipe, stream), daemon=True).start()
 
 # ===========================================
 # 🔹 Service Control
@@ -141,19 +281,23 @@ def stop_all_services():
                 pass
     
     update_vortex_status(running=False, error="Service stopped by user")
+    if image_cache_dir:
+        shutil.rmtree(image_cache_dir, ignore_errors=True)
+    if raster_pool:
+        raster_pool.shutdown(wait=False, cancel_futures=True)
     print("   ✓ All services stopped")
     print("=" * 50 + "\n")
 
-# Register cleanup handlers
-atexit.register(stop_all_services)
-
 def signal_handler(signum, frame):
     """Handle system signals"""
     stop_all_services()
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+def register_cleanup_handlers():
+    """atexit and signal handlers, for the server process only (not pool workers)"""
+    atexit.register(stop_all_services)
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
 
 # ===========================================
 # 🔹 Find vortex.exe
@@ -766,36 +910,36 @@ STATUS_HTML = """
             </div>
         </div>
 
-        <div class="status-badge {{ 'status-running' if status.running else 'status-stopped' }}">
+        <div id="status-badge" class="status-badge {{ 'status-running' if status.running else 'status-stopped' }}">
             <div class="pulse-dot"></div>
-            {{ 'VORTEX SERVICE RUNNING' if status.running else 'VORTEX SERVICE STOPPED' }}
+            <span id="status-text">{{ 'VORTEX SERVICE RUNNING' if status.running else 'VORTEX SERVICE STOPPED' }}</span>
         </div>
 
         <div class="info-grid">
             <div class="info-card">
                 <div class="info-label">Last Start Time</div>
-                <div class="info-value">{{ status.last_start or 'N/A' }}</div>
+                <div class="info-value" id="last_start">{{ status.last_start or 'N/A' }}</div>
             </div>
 
             <div class="info-card">
                 <div class="info-label">Process ID</div>
-                <div class="info-value">{{ status.process_id or 'N/A' }}</div>
+                <div class="info-value" id="process_id">{{ status.process_id or 'N/A' }}</div>
             </div>
 
             <div class="info-card">
                 <div class="info-label">Restart Count</div>
-                <div class="info-value">{{ status.restart_count }}</div>
+                <div class="info-value" id="restart_count">{{ status.restart_count }}</div>
             </div>
 
             <div class="info-card">
                 <div class="info-label">Last Error</div>
-                <div class="info-value log-error">{{ status.last_error or 'None' }}</div>
+                <div class="info-value log-error" id="last_error">{{ status.last_error or 'None' }}</div>
             </div>
         </div>
 
         <div class="log-section">
             <h2>📜 Console Log (Last 50 Entries)</h2>
-            <div class="log-container">
+            <div class="log-container" id="log-container">
                 {% if status.last_output %}
                     {% for line in status.last_output %}
                     <div class="log-line">{{ line }}</div>
@@ -806,40 +950,197 @@ STATUS_HTML = """
             </div>
         </div>
 
-        <div class="footer">
-            Auto-refreshing every 5 seconds.
+        <div class="log-section" style="margin-top: 25px;">
+            <h2>🖨️ Recent Activity</h2>
+            <div class="log-container" id="activity-container" style="max-height: 200px;">
+                <div class="log-empty">No print jobs since this page was opened.</div>
+            </div>
+        </div>
+
+        <div class="footer" id="stream-state">
+            Connecting to live updates...
         </div>
     </div>
 
     <script>
+        const MAX_LINES = 50;
+        const logContainer = document.getElementById('log-container');
+        const activityContainer = document.getElementById('activity-container');
+        const streamState = document.getElementById('stream-state');
+
         function refreshStatus() { location.reload(); }
-        setInterval(refreshStatus, 5000);
-        // Scroll to bottom of log
-        const logContainer = document.querySelector('.log-container');
-        if (logContainer) logContainer.scrollTop = logContainer.scrollHeight;
+
+        function setStatus(status) {
+            if ('running' in status) {
+                document.getElementById('status-badge').className =
+                    'status-badge ' + (status.running ? 'status-running' : 'status-stopped');
+                document.getElementById('status-text').textContent =
+                    status.running ? 'VORTEX SERVICE RUNNING' : 'VORTEX SERVICE STOPPED';
+            }
+            if ('last_start' in status) document.getElementById('last_start').textContent = status.last_start || 'N/A';
+            if ('process_id' in status) document.getElementById('process_id').textContent = status.process_id || 'N/A';
+            if ('restart_count' in status) document.getElementById('restart_count').textContent = status.restart_count;
+            if ('last_error' in status) document.getElementById('last_error').textContent = status.last_error || 'None';
+        }
+
+        function appendLine(container, text, className) {
+            const atBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 5;
+            const empty = container.querySelector('.log-empty');
+            if (empty) empty.remove();
+            const div = document.createElement('div');
+            div.className = className;
+            div.textContent = text;
+            container.appendChild(div);
+            while (container.children.length > MAX_LINES) container.removeChild(container.firstChild);
+            if (atBottom) container.scrollTop = container.scrollHeight;
+        }
+
+        function connect() {
+            const source = new EventSource('/api/status/stream');
+            source.onopen = () => { streamState.textContent = 'Live: updates are pushed by the server.'; };
+            source.onerror = () => { streamState.textContent = 'Disconnected, reconnecting...'; };
+            source.addEventListener('snapshot', (e) => {
+                const status = JSON.parse(e.data);
+                setStatus(status);
+                logContainer.innerHTML = '';
+                (status.last_output || []).forEach((line) => appendLine(logContainer, line, 'log-line'));
+                if (!logContainer.children.length) {
+                    logContainer.innerHTML = '<div class="log-empty">No output captured yet...</div>';
+                }
+            });
+            source.addEventListener('status', (e) => setStatus(JSON.parse(e.data)));
+            source.addEventListener('log', (e) => {
+                const entry = JSON.parse(e.data);
+                appendLine(logContainer, entry.line, entry.stream === 'stderr' ? 'log-line log-error' : 'log-line');
+            });
+            source.addEventListener('job', (e) => {
+                const job = JSON.parse(e.data);
+                const target = job.pool ? `pool:${job.pool} → ${job.printer || '-'}` : job.printer;
+                const text = `[${job.time}] ${job.mode} on ${target}: ${job.status}` + (job.error ? ` (${job.error})` : '');
+                appendLine(activityContainer, text, job.status === 'ok' ? 'log-line' : 'log-line log-error');
+            });
+            source.addEventListener('printer', (e) => {
+                const ev = JSON.parse(e.data);
+                appendLine(activityContainer, `[${new Date().toISOString()}] printer ${ev.printer}: ${ev.state}`, 'log-line log-error');
+            });
+        }
+
+        logContainer.scrollTop = logContainer.scrollHeight;
+        connect();
     </script>
 </body>
 </html>
 """
 
+# ===========================================
+# 🔹 Page templates (compiled once) and conditional GET
+# ===========================================
+with startup_phase("compile templates"):
+    CONFIG_TEMPLATE = app.jinja_env.from_string(CONFIG_HTML)
+    STATUS_TEMPLATE = app.jinja_env.from_string(STATUS_HTML)
+
+def html_response(html):
+    """Dynamic HTML page with an ETag so unchanged pages are answered with 304"""
+    response = Response(html, mimetype="text/html")
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+def static_page(html):
+    """Pre-encode a static page once: identity and gzip bodies plus their ETag"""
+    body = html.encode("utf-8")
+    return {
+        "body": body,
+        "gzip": gzip.compress(body, 9),
+        "etag": hashlib.sha1(body).hexdigest()
+    }
+
+def static_page_response(page, max_age=3600):
+    """Serve a pre-encoded page, gzipped when the client accepts it"""
+    response = Response(mimetype="text/html")
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    response.vary.add("Accept-Encoding")
+    if "gzip" in request.accept_encodings:
+        response.set_data(page["gzip"])
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(page["etag"] + "-gz")
+    else:
+        response.set_data(page["body"])
+        response.set_etag(page["etag"])
+    return response.make_conditional(request)
+
 @app.route("/status", methods=["GET"])
 def status_page():
     """Show vortex status page"""
-    return render_template_string(STATUS_HTML, status=vortex_status)
+    return html_response(STATUS_TEMPLATE.render(status=vortex_status_snapshot()))
 
 @app.route("/api/status", methods=["GET"])
 def api_status():
     """API endpoint for vortex status"""
-    return jsonify(vortex_status)
+    return jsonify(dict(vortex_status_snapshot(), admission=admission_snapshot(), coalescing=coalesce_snapshot()))
+
+@app.route("/api/status/stream", methods=["GET"])
+def api_status_stream():
+    """Server-Sent Events stream of status deltas, log lines and job/printer events"""
+    q = subscribe_events()
+
+    def generate():
+        try:
+            yield "retry: 3000\n"
+            yield f"event: snapshot\ndata: {json.dumps(vortex_status_snapshot(), default=str)}\n\n"
+            while q in stream_subscribers and not flask_shutdown:
+                try:
+                    yield q.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            unsubscribe_events(q)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/status/logs", methods=["GET"])
+def api_status_logs():
+    """Paginated vortex output.
+
+    `since` returns entries with a sequence number above it (oldest first),
+    otherwise the last `limit` entries are returned. Use `next` as the
+    following `since`.
+    """
+    try:
+        since = request.args.get("since", type=int)
+        limit = min(max(request.args.get("limit", 200, type=int), 1), VORTEX_LOG_LINES)
+    except Exception:
+        return jsonify({"error": "Invalid 'since' or 'limit'"}), 400
+
+    with vortex_output_lock:
+        entries = list(vortex_output)
+    first = entries[0]["seq"] if entries else None
+    if since is None:
+        page = entries[-limit:]
+    else:
+        # Sequence numbers are contiguous, so the start index is computed directly
+        start = 0 if first is None else min(max(since + 1 - first, 0), len(entries))
+        page = entries[start:start + limit]
+    return jsonify({
+        "entries": page,
+        "first": first,
+        "next": page[-1]["seq"] if page else (since or 0),
+        "truncated": since is not None and first is not None and since + 1 < first,
+        "more": bool(page) and page[-1]["seq"] < entries[-1]["seq"]
+    })
 
 
 
 # ===========================================
 # 🔹 Device Info
 # ===========================================
+NETWORK_REFRESH_SECONDS = 300
+
+@functools.lru_cache(maxsize=None)
 def get_device_id():
     """
-    Generates a unique, stable device ID.
+    Generates a unique, stable device ID (computed once per process).
     Tries Windows MachineGUID first, then falls back to MAC address.
     """
     id_str = ""
@@ -863,11 +1164,18 @@ def get_device_id():
     # Hash it for a clean, consistent ID
     return hashlib.sha256(id_str.encode('utf-8')).hexdigest()
 
-@app.route("/api/device-info", methods=["GET"])
-def device_info():
-    """
-    Exposes current device information, including IPs and a unique ID.
-    """
+network_info = {
+    "hostname": None,
+    "ipv4": "N/A",
+    "ipv6": "N/A",
+    "updated": None
+}
+network_changed = threading.Event()
+network_refresher_started = False
+network_refresher_lock = threading.Lock()
+
+def lookup_network_info():
+    """Resolve hostname and primary addresses (may block on broken DNS)"""
     hostname = socket.gethostname()
     ipv4_addr = 'N/A'
     ipv6_addr = 'N/A'
@@ -892,20 +1200,74 @@ def device_info():
     except Exception:
         pass  # N/A is already set
 
+    return {
+        "hostname": hostname,
+        "ipv4": ipv4_addr,
+        "ipv6": ipv6_addr,
+        "updated": datetime.now().isoformat()
+    }
+
+def _watch_address_changes():
+    """Set `network_changed` whenever the IP address table changes (Windows only)"""
+    try:
+        notify = ctypes.windll.iphlpapi.NotifyAddrChange
+    except Exception:
+        return  # No change notifications, the timer refresh still applies
+    while not flask_shutdown:
+        # Synchronous mode: blocks until an address is added or removed
+        if notify(None, None) != 0:
+            return
+        network_changed.set()
+
+def _refresh_network_info_loop():
+    global network_info
+    while not flask_shutdown:
+        try:
+            network_info = lookup_network_info()
+        except Exception as e:
+            print(f"Error refreshing network info: {e}")
+        network_changed.wait(NETWORK_REFRESH_SECONDS)
+        network_changed.clear()
+
+def start_network_refresher():
+    """Start the background network info refresher once"""
+    global network_refresher_started
+    with network_refresher_lock:
+        if network_refresher_started:
+            return
+        network_refresher_started = True
+    threading.Thread(target=_refresh_network_info_loop, daemon=True).start()
+    threading.Thread(target=_watch_address_changes, daemon=True).start()
+
+@functools.lru_cache(maxsize=None)
+def static_device_info():
+    """Device fields that do not change while the process runs"""
     try:
         device_id = get_device_id()
     except Exception as e:
         device_id = f"Error generating ID: {str(e)}"
-
-    info = {
+    return {
         "deviceId": device_id,
-        "hostname": hostname,
-        "ipv4": ipv4_addr,
-        "ipv6": ipv6_addr,
         "os": f"{platform.system()} {platform.release()}",
         "osVersion": platform.version(),
         "currentUser": getpass.getuser()
     }
+
+@app.route("/api/device-info", methods=["GET"])
+def device_info():
+    """
+    Exposes current device information, including IPs and a unique ID.
+    Served from memory; addresses are refreshed in the background.
+    """
+    start_network_refresher()
+    net = network_info
+    info = dict(static_device_info())
+    info.update({
+        "hostname": net["hostname"] or socket.gethostname(),
+        "ipv4": net["ipv4"],
+        "ipv6": net["ipv6"],
+        "networkUpdated": net["updated"]
+    })
     return jsonify(info)
 
 
@@ -914,7 +1276,8 @@ def device_info():
 def config_page():
     """Show configuration page"""
     config = get_config()
-    return render_template_string(CONFIG_HTML, config=config, configured=is_configured())
+    configured = all(config.get(k) for k in ["site", "provider", "host", "port", "email"])
+    return html_response(CONFIG_TEMPLATE.render(config=config, configured=configured))
 
 @app.route("/config", methods=["POST"])
 def save_config_endpoint():
@@ -924,6 +1287,10 @@ def save_config_endpoint():
         if save_config(data):
             global vortex_restart_flag
             vortex_restart_flag = True
+            load_pools()
+            load_printer_profiles()
+            load_admission_limits()
+            load_peers()
             return jsonify({"success": True})
         else:
             return jsonify({"success": False, "error": "Failed to save configuration"}), 500
@@ -947,6 +1314,10 @@ def make_printer_id(p):
     name = p.get("pPrinterName", "") or p.get("Name", "")
     port = p.get("pPortName", "") or ""
     driver = p.get("pDriverName", "") or ""
+    return _printer_id(name, port, driver)
+
+@functools.lru_cache(maxsize=1024)
+def _printer_id(name, port, driver):
     unique_str = f"{name}|{port}|{driver}"
     return hashlib.md5(unique_str.encode("utf-8")).hexdigest()[:8]
 
@@ -964,6 +1335,121 @@ def schedule_remove(path, delay_seconds=60):
     t.daemon = True
     t.start()
 
+# ===========================================
+# 🔹 Job phase timing
+# ===========================================
+JOB_TIMINGS_KEEP = 500
+
+job_timings = deque(maxlen=JOB_TIMINGS_KEEP)
+job_ids = itertools.count(1)
+job_context = threading.local()
+trace_file = None
+trace_file_lock = threading.Lock()
+
+def begin_job():
+    """Start timing a print job on the current thread"""
+    job = {
+        "id": next(job_ids),
+        "time": datetime.now().isoformat(),
+        "t0": time.perf_counter(),
+        "printer": None,
+        "mode": None,
+        "status": None,
+        "phases": []
+    }
+    job_context.job = job
+    return job
+
+def current_job():
+    return getattr(job_context, "job", None)
+
+@contextlib.contextmanager
+def job_phase(name):
+    """Time one phase of the current print job (no-op outside a job)"""
+    job = current_job()
+    if job is None:
+        yield
+        return
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        job["phases"].append((name, t, time.perf_counter() - t, threading.get_ident()))
+
+def count_job_bytes(name, before, after):
+    """Record what an encoder stage sent vs its plain form (no-op outside a job)"""
+    job = current_job()
+    if job is not None:
+        counts = job.setdefault("bytes", {}).setdefault(name, {"sent": 0, "saved": 0})
+        counts["sent"] += after
+        counts["saved"] += before - after
+
+def job_summary(job):
+    """Per-phase milliseconds (summed when a phase repeats) and the total"""
+    phases = {}
+    for name, _, seconds, _ in job["phases"]:
+        phases[name] = phases.get(name, 0) + seconds * 1000
+    summary = {
+        "job_id": job["id"],
+        "time": job["time"],
+        "printer": job["printer"],
+        "mode": job["mode"],
+        "status": job["status"],
+        "total_ms": round(job["total"] * 1000, 3),
+        "phases": {k: round(v, 3) for k, v in phases.items()}
+    }
+    if "bytes" in job:
+        summary["bytes"] = job["bytes"]
+    return summary
+
+def job_trace_events(job):
+    """Chrome trace-event ("X" complete events) for one job, times in µs"""
+    args = {"job_id": job["id"], "printer": job["printer"], "mode": job["mode"], "status": job["status"]}
+    tid = job["phases"][0][3] if job["phases"] else threading.get_ident()
+    events = [{
+        "name": f"print {job['mode'] or '?'}", "cat": "job", "ph": "X", "pid": os.getpid(), "tid": tid,
+        "ts": round((job["t0"] - startup_t0) * 1e6, 1), "dur": round(job["total"] * 1e6, 1), "args": args
+    }]
+    for name, t, seconds, thread in job["phases"]:
+        events.append({
+            "name": name, "cat": "phase", "ph": "X", "pid": os.getpid(), "tid": thread,
+            "ts": round((t - startup_t0) * 1e6, 1), "dur": round(seconds * 1e6, 1), "args": {"job_id": job["id"]}
+        })
+    return events
+
+def finish_job(job, status):
+    """Stop timing, keep the job for /api/jobs/timings and append it to the trace file"""
+    job["total"] = time.perf_counter() - job["t0"]
+    job["status"] = status
+    job_context.job = None
+    job_timings.append(job)
+    if trace_file is not None:
+        lines = "".join(json.dumps(e) + ",\n" for e in job_trace_events(job))
+        with trace_file_lock:
+            trace_file.write(lines)
+            trace_file.flush()
+
+def open_trace_file(path):
+    """Stream trace events to `path` (JSON array format, loadable without the closing bracket)"""
+    global trace_file
+    trace_file = open(path, "w", encoding="utf-8")
+    trace_file.write("[\n")
+    print(f"✓ Writing print job trace to {path}")
+
+@app.route("/api/jobs/timings", methods=["GET"])
+def api_job_timings():
+    """Phase timings of recent print jobs; `format=trace` returns Chrome trace-event JSON"""
+    jobs = list(job_timings)
+    limit = request.args.get("limit", type=int)
+    if limit:
+        jobs = jobs[-limit:]
+    if request.args.get("format") == "trace":
+        events = [e for job in jobs for e in job_trace_events(job)]
+        response = jsonify({"traceEvents": events, "displayTimeUnit": "ms"})
+        response.headers["Content-Disposition"] = "attachment; filename=printlink-trace.json"
+        return response
+    return jsonify({"jobs": [job_summary(job) for job in jobs]})
+
 # ===========================================
 # 🔹 Manual CORS headers
 # ===========================================
@@ -977,191 +1463,2667 @@ def after_request(response):
 # ===========================================
 # 🔹 Convert Image to ESC/POS bytes
 # ===========================================
-def image_to_escpos_bytes(img_data, is_url=False):
+RASTER_BAND_HEIGHT = 256                             # Rows per GS v 0 command
+INVERT_BITS = bytes(255 - i for i in range(256))     # PIL "1": 1 = white, ESC/POS: 1 = black
+
+def image_bytes(img_data, is_url=False):
+    """Encoded image bytes from base64, a data: URL or a remote URL"""
     if is_url:
         if img_data.startswith("data:image"):
             header, b64data = img_data.split(",", 1)
-            im = Image.open(io.BytesIO(base64.b64decode(b64data)))
-        else:
+            with job_phase("decode"):
+                return base64.b64decode(b64data)
+        import requests
+        with job_phase("fetch"):
             r = requests.get(img_data)
             r.raise_for_status()
-            im = Image.open(io.BytesIO(r.content))
-    else:
-        im = Image.open(io.BytesIO(base64.b64decode(img_data)))
+        return r.content
+    with job_phase("decode"):
+        return base64.b64decode(img_data)
+
+def raster_bands(im, band_height=RASTER_BAND_HEIGHT, elide=False, trim=False):
+    """Yield a 1-bit image as a series of GS v 0 commands, `band_height` rows each.
 
-    if im.mode != "1":
-        im = im.convert("1")
+    Only one band of raster data exists at a time, no single command hits the
+    16-bit height limit, and the first band can be written to the printer
+    while the rest is still being converted.
 
-    if im.size[0] % 8:
-        new_width = im.size[0] + (8 - im.size[0] % 8)
-        im2 = Image.new("1", (new_width, im.size[1]), "white")
-        im2.paste(im, (0, 0))
-        im = im2
+    With `elide` (the ESC J motion units per raster row, or False), runs of
+    white rows become paper feeds wherever that is shorter.
+    With `trim`, white columns at the right edge are not sent at all.
+    """
+    width, height = im.size
+    full_size = width // 8 * height + 8 * -(-height // band_height)
+    if trim:
+        box = im.convert("L").point(lambda v: 255 - v).getbbox()  # Bounding box of black pixels
+        width = -(-box[2] // 8) * 8 if box else 8
+    width_bytes = width // 8
+    blank = bytes(width_bytes)
+    header = lambda rows: b"\x1d\x76\x30\x00" + struct.pack("<2H", width_bytes, rows)
+    sent = 0
+    pending = []   # Rows waiting for a GS v 0 command
+    blank_run = 0  # White rows not yet sent
+
+    def flush_blank():
+        # Feeding replaces the rows and may split a band (one more header)
+        nonlocal blank_run
+        out = []
+        units = blank_run * elide
+        if blank_run * width_bytes > 3 * -(-units // 255) + 8:
+            if pending:
+                out.append(header(len(pending)) + b"".join(pending))
+                pending.clear()
+            for n in range(units, 0, -255):
+                out.append(b"\x1bJ" + bytes([min(n, 255)]))
+        else:
+            pending.extend([blank] * blank_run)
+        blank_run = 0
+        return out
+
+    for top in range(0, height, band_height):
+        with job_phase("render"):
+            rows = min(band_height, height - top)
+            data = im.crop((0, top, width, top + rows)).tobytes().translate(INVERT_BITS)
+            if not elide:
+                out = [header(rows) + data]
+            else:
+                out = []
+                for offset in range(0, len(data), width_bytes):
+                    row = data[offset:offset + width_bytes]
+                    if row == blank:
+                        blank_run += 1
+                        continue
+                    if blank_run:
+                        out += flush_blank()
+                    pending.append(row)
+                    if len(pending) >= band_height:
+                        out.append(header(band_height) + b"".join(pending[:band_height]))
+                        del pending[:band_height]
+                if top + rows == height:
+                    out += flush_blank()
+                    while pending:
+                        out.append(header(min(len(pending), band_height)) + b"".join(pending[:band_height]))
+                        del pending[:band_height]
+        for chunk in out:
+            sent += len(chunk)
+            yield chunk
+    count_job_bytes("raster", full_size, sent)
+
+def to_raster_image(im):
+    """Dither to 1-bit and pad the width to whole bytes with white"""
+    from PIL import Image
+    with job_phase("render"):
+        if im.mode != "1":
+            im = im.convert("1")
+
+        if im.size[0] % 8:
+            new_width = im.size[0] + (8 - im.size[0] % 8)
+            im2 = Image.new("1", (new_width, im.size[1]), "white")
+            im2.paste(im, (0, 0))
+            im = im2
+    return im
+
+def iter_image_to_escpos(img_data, is_url=False, band_height=RASTER_BAND_HEIGHT, elide=False, trim=False):
+    """Decode and dither an image now; return a generator of GS v 0 bands.
+
+    Decoding happens before the first band is requested, so bad image data
+    fails before anything is sent to the printer.
+    """
+    from PIL import Image
+    data = image_bytes(img_data, is_url)
+    im = Image.open(io.BytesIO(data))  # Reads the header only
+    pool = get_raster_pool() if im.size[0] * im.size[1] >= RASTER_POOL_MIN_PIXELS else None
+    if pool is not None:
+        try:
+            return pooled_raster_bands(pool, data, im.size, band_height, elide, trim)
+        except concurrent.futures.process.BrokenProcessPool:
+            reset_raster_pool(pool)
+    return raster_bands(to_raster_image(im), band_height, elide, trim)
 
-    im = ImageOps.invert(im.convert("L")).convert("1")
+def image_to_escpos_bytes(img_data, is_url=False, elide=False, trim=False):
+    return b"".join(iter_image_to_escpos(img_data, is_url=is_url, elide=elide, trim=trim))
 
-    width_bytes = int(im.size[0] / 8)
-    height = im.size[1]
-    header = b"\x1d\x76\x30\x00" + struct.pack("2B", width_bytes % 256, width_bytes // 256)
-    header += struct.pack("2B", height % 256, height // 256)
-    return header + im.tobytes()
+def raster_options(printer_name):
+    """Raster encoder options from the printer profile.
+
+    Blank rows are only elided when the profile opts in, since ESC J counts
+    motion units, not dot rows: "feed_units_per_dot" is 2 on a TM-T88
+    (1/360" units, 1/180" dots) and defaults to 1.
+    """
+    profile = get_printer_profile(printer_name)
+    units = profile.get("feed_units_per_dot", 1)
+    if not isinstance(units, int) or isinstance(units, bool) or units < 1:
+        units = 1
+    return {"elide": units if profile.get("elide_blank_rows") is True else False,
+            "trim": profile.get("trim_raster", False) is True}
+
+# ===========================================
+# 🔹 Raster process pool
+# ===========================================
+RASTER_POOL_MIN_PIXELS = 250_000       # Smaller images convert faster in-thread than the IPC round trip
+PREPROCESS_POOL_MIN_BYTES = 256 * 1024
+
+raster_pool = None                     # None: not started yet, False: disabled
+raster_pool_lock = threading.Lock()
+
+def raster_pool_size():
+    """Worker processes from the "raster_workers" config value (0 disables, empty = auto).
+
+    Always 0 on a single CPU, where workers only compete with the server threads.
+    """
+    cpus = os.cpu_count() or 1
+    if cpus < 2:
+        return 0
+    value = str(get_config().get("raster_workers", "")).strip()
+    if not value:
+        return min(4, cpus - 1)
+    return max(0, int(value))
+
+def get_raster_pool():
+    """The shared process pool for CPU-heavy image work, or None when disabled"""
+    global raster_pool
+    if raster_pool is None:
+        with raster_pool_lock:
+            if raster_pool is None:
+                try:
+                    size = raster_pool_size()
+                except ValueError:
+                    size = 0
+                # spawn: the same start method everywhere, and no fork of a threaded server
+                raster_pool = concurrent.futures.ProcessPoolExecutor(
+                    size, mp_context=multiprocessing.get_context("spawn")) if size else False
+                if size:
+                    print(f"✓ Raster pool: {size} worker process(es)")
+    return raster_pool or None
+
+def reset_raster_pool(broken):
+    """Drop a pool whose worker died; the next heavy job starts a new one"""
+    global raster_pool
+    print("⚠️ Raster pool broke, converting in-thread until it restarts")
+    with raster_pool_lock:
+        if raster_pool is broken:
+            raster_pool = None
+    broken.shutdown(wait=False)
+
+def run_in_pool(pool, fn, *args):
+    """fn(*args) in a pool worker, or in-thread without a pool or when the pool broke"""
+    if pool is not None:
+        try:
+            return pool.submit(fn, *args).result()
+        except concurrent.futures.process.BrokenProcessPool:
+            reset_raster_pool(pool)
+    return fn(*args)
+
+RASTER_RING_BANDS = 4                  # Bands buffered between a pool worker and the spooler
+RASTER_RING_POLL_SECONDS = 0.001
+RASTER_RING_HEADER = struct.Struct("<QQQ")  # Bytes written (worker), bytes read, cancelled (server)
+
+def _ring_write(buf, capacity, pos, data):
+    """Copy data into the ring after the header, wrapping at capacity"""
+    start = RASTER_RING_HEADER.size + pos % capacity
+    first = min(len(data), RASTER_RING_HEADER.size + capacity - start)
+    buf[start:start + first] = data[:first]
+    buf[RASTER_RING_HEADER.size:RASTER_RING_HEADER.size + len(data) - first] = data[first:]
+
+def _ring_read(buf, capacity, pos, size):
+    """Copy size bytes out of the ring, wrapping at capacity"""
+    start = RASTER_RING_HEADER.size + pos % capacity
+    first = min(size, RASTER_RING_HEADER.size + capacity - start)
+    return bytes(buf[start:start + first]) + bytes(buf[RASTER_RING_HEADER.size:RASTER_RING_HEADER.size + size - first])
+
+def _raster_worker(src_name, src_size, ring_name, capacity, band_height, elide, trim):
+    """Pool side: encoded image in one shared block -> GS v 0 commands through a ring in another.
+
+    Each command is written as a 4-byte length and the bytes, as soon as the
+    ring has room, so the server can send a band while the next is rendered.
+    """
+    from PIL import Image
+    src = shared_memory.SharedMemory(src_name)
+    ring = shared_memory.SharedMemory(ring_name)
+    try:
+        im = to_raster_image(Image.open(io.BytesIO(bytes(src.buf[:src_size]))))
+        written = 0
+        for band in raster_bands(im, band_height, elide, trim):
+            frame = len(band).to_bytes(4, "little") + bytes(band)
+            while True:
+                _, read, cancelled = RASTER_RING_HEADER.unpack_from(ring.buf)
+                if cancelled:
+                    return
+                if capacity - (written - read) >= len(frame):
+                    break
+                time.sleep(RASTER_RING_POLL_SECONDS)
+            _ring_write(ring.buf, capacity, written, frame)
+            written += len(frame)
+            struct.pack_into("<Q", ring.buf, 0, written)
+    finally:
+        src.close()
+        ring.close()
+
+def pooled_raster_bands(pool, data, size, band_height=RASTER_BAND_HEIGHT, elide=False, trim=False):
+    """Rasterise in a pool worker; returns a generator of commands like raster_bands().
+
+    Both shared blocks are allocated here so they outlive the worker's handles.
+    The ring holds a few bands, so memory stays bounded and the first band
+    goes out while the worker renders the rest. Waits for the first band
+    before returning, so bad image data fails before anything is sent.
+    """
+    width, height = size
+    width_bytes = (width + 7) // 8
+    full_size = width_bytes * height + 8 * -(-height // band_height)
+    capacity = RASTER_RING_BANDS * (4 + 8 + width_bytes * band_height)
+
+    def bands():
+        src = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        ring = shared_memory.SharedMemory(create=True, size=RASTER_RING_HEADER.size + capacity)
+        try:
+            src.buf[:len(data)] = data
+            ring.buf[:RASTER_RING_HEADER.size] = bytes(RASTER_RING_HEADER.size)
+            future = pool.submit(_raster_worker, src.name, len(data), ring.name, capacity, band_height, elide, trim)
+            read = sent = 0
+            while True:
+                written = RASTER_RING_HEADER.unpack_from(ring.buf)[0]
+                if written == read:
+                    if future.done():
+                        future.result()  # Raises the worker's error
+                        if RASTER_RING_HEADER.unpack_from(ring.buf)[0] == read:
+                            break
+                        continue
+                    with job_phase("render"):
+                        while RASTER_RING_HEADER.unpack_from(ring.buf)[0] == read and not future.done():
+                            time.sleep(RASTER_RING_POLL_SECONDS)
+                    continue
+                length = int.from_bytes(_ring_read(ring.buf, capacity, read, 4), "little")
+                band = _ring_read(ring.buf, capacity, read + 4, length)
+                read += 4 + length
+                struct.pack_into("<Q", ring.buf, 8, read)
+                sent += length
+                yield band
+            count_job_bytes("raster", full_size, sent)
+        finally:
+            struct.pack_into("<Q", ring.buf, 16, 1)  # Stops a worker left waiting for room
+            for block in (src, ring):
+                block.close()
+                block.unlink()
+
+    def started(out, first):
+        if first is not None:
+            yield first
+        yield from out  # Passes close() on, which cancels the worker
+    out = bands()
+    return started(out, next(out, None))
 
 # ===========================================
 # 🔹 Combine Logo + Text (ESC/POS)
 # ===========================================
+def iter_escpos_with_logo(logo_data, text, is_url=False, text_bytes=None, raster=None):
+    """Logo + text receipt as a sequence of byte chunks (logo streamed in bands).
+
+    `text_bytes` is the already encoded text; UTF-8 is used when it is omitted.
+    `raster` holds raster_bands() options (see raster_options()).
+    """
+    logo_bands = iter_image_to_escpos(logo_data, is_url=is_url or logo_data.startswith("data:image"),
+                                      **(raster or {}))
+    yield b"\x1B\x40\x1B\x61\x01"
+    yield from logo_bands
+    yield b"".join([
+        b"\x1B\x61\x00",
+        b"\n",
+        text.encode("utf-8") if text_bytes is None else text_bytes,
+        b"\n\n\n",
+        b"\x1D\x56\x00"
+    ])
+
 def build_escpos_with_logo(logo_data, text, is_url=False):
-    if logo_data.startswith("data:image"):
-        logo_bytes = image_to_escpos_bytes(logo_data, is_url=True)
+    commands = b"".join(iter_escpos_with_logo(logo_data, text, is_url=is_url))
+    return base64.b64encode(commands).decode("utf-8")
+
+# ===========================================
+# 🔹 Stored logos (printer NV / download graphics memory)
+# ===========================================
+# GS ( L functions: define, print and delete graphics by key code
+LOGO_STORAGE_FUNCTIONS = {
+    "nv": (67, 69, 66),        # Non-volatile: survives power cycles, limited rewrites
+    "download": (83, 85, 82)   # RAM: cleared when the printer is reset or switched off
+}
+STORED_LOGO_SLOTS = 4              # Logos kept per printer before the oldest is deleted
+STORED_LOGO_MAX_SIZE = (8192, 2304)
+
+stored_logos = {}          # (printer name, storage) -> {key code: logo sha1}, least recently used first
+stored_logos_lock = threading.Lock()
+
+def logo_storage(printer_name):
+    """The profile's "logo_storage" ("nv" or "download"), or None to send the raster every time"""
+    storage = get_printer_profile(printer_name).get("logo_storage")
+    return storage if storage in LOGO_STORAGE_FUNCTIONS else None
+
+def _graphics_command(fn, params):
+    """GS ( L (or GS 8 L when the parameters need a 4-byte length) with m = 48"""
+    body = bytes([48, fn]) + params
+    if len(body) <= 0xFFFF:
+        return b"\x1D\x28\x4C" + struct.pack("<H", len(body)) + body
+    return b"\x1D\x38\x4C" + struct.pack("<I", len(body)) + body
+
+@functools.lru_cache(maxsize=16)
+def stored_logo_raster(data):
+    """(width, height, raster bytes) of a logo, or None when it is too big to store"""
+    from PIL import Image
+    im = to_raster_image(Image.open(io.BytesIO(data)))
+    if im.size[0] > STORED_LOGO_MAX_SIZE[0] or im.size[1] > STORED_LOGO_MAX_SIZE[1]:
+        return None
+    return im.size[0], im.size[1], im.tobytes().translate(INVERT_BITS)
+
+def logo_key(digest):
+    """Two printable key codes (33-126) derived from the logo's hash"""
+    return bytes([33 + digest[0] % 94, 33 + digest[1] % 94])
+
+def stored_logo_commands(printer_name, storage, data):
+    """(setup, print) bytes for a logo kept in printer memory, or None to send it as a raster.
+
+    `setup` deletes and (re)defines the logo when the printer is not known to
+    hold this version under its key, and deletes the least recently used logo
+    when the printer's slots are full; it is empty otherwise.
+    """
+    raster = stored_logo_raster(data)
+    if raster is None:
+        return None
+    define, draw, delete = LOGO_STORAGE_FUNCTIONS[storage]
+    digest = hashlib.sha1(data).digest()
+    key = logo_key(digest)
+    setup = []
+    with stored_logos_lock:
+        held = stored_logos.setdefault((printer_name, storage), {})
+        if held.get(key) != digest:
+            if key not in held and len(held) >= STORED_LOGO_SLOTS:
+                setup.append(_graphics_command(delete, next(iter(held))))
+            setup.append(_graphics_command(delete, key))
+            width, height, bits = raster
+            setup.append(_graphics_command(define, b"\x30" + key + b"\x01" +
+                                           struct.pack("<2H", width, height) + b"\x31" + bits))
+    return b"".join(setup), _graphics_command(draw, key + b"\x01\x01")
+
+def remember_stored_logo(printer_name, storage, data):
+    """Record that a printer holds a logo (after a job using it printed)"""
+    digest = hashlib.sha1(data).digest()
+    key = logo_key(digest)
+    with stored_logos_lock:
+        held = stored_logos.setdefault((printer_name, storage), {})
+        held.pop(key, None)
+        held[key] = digest
+        while len(held) > STORED_LOGO_SLOTS:
+            del held[next(iter(held))]
+
+def forget_stored_logos(printer_name):
+    """The printer may have been reset: upload its download (RAM) logos again next time.
+
+    NV logos survive resets and wear out with rewrites, so they are only
+    defined again when the logo itself changes.
+    """
+    with stored_logos_lock:
+        if stored_logos.pop((printer_name, "download"), None):
+            print(f"ℹ️ Download logos on {printer_name} will be uploaded again")
+
+def forget_reset_printers(old, new):
+    """Forget the download logos of printers that came back online or reappeared"""
+    before = {p["Name"]: p for p in old}
+    for p in new:
+        was = before.get(p["Name"])
+        if (was is None or printer_offline(was)) and not printer_offline(p) and (p["Name"], "download") in stored_logos:
+            forget_stored_logos(p["Name"])
+
+def escpos_with_stored_logo(printer_name, storage, logo_data, text_bytes, is_url=False):
+    """Logo + text receipt printing the logo by key; None when the logo cannot be stored.
+
+    Returns {"setup", "chunks", "logo"}: setup is sent once per job (not per copy).
+    """
+    data = image_bytes(logo_data, is_url or logo_data.startswith("data:image"))
+    with job_phase("render"):
+        commands = stored_logo_commands(printer_name, storage, data)
+    if commands is None:
+        return None
+    setup, draw = commands
+    return {
+        "setup": setup,
+        "chunks": [b"".join([b"\x1B\x40\x1B\x61\x01", draw, b"\x1B\x61\x00\n", text_bytes,
+                             b"\n\n\n\x1D\x56\x00"])],
+        "logo": (printer_name, storage, data)
+    }
+
+# ===========================================
+# 🔹 Barcodes and QR codes (ESC/POS)
+# ===========================================
+QR_ERROR_LEVELS = {"L": 48, "M": 49, "Q": 50, "H": 51}
+QR_MAX_BYTES = 2953        # Byte mode capacity of a version 40 symbol at level L
+BARCODE_SYMBOLOGIES = {   # GS k function B (m = 65..73)
+    "UPCA": 65, "UPCE": 66, "EAN13": 67, "EAN8": 68, "CODE39": 69,
+    "ITF": 70, "CODABAR": 71, "CODE93": 72, "CODE128": 73
+}
+BARCODE_DIGITS = {"UPCA": (11, 12), "UPCE": (6, 8), "EAN13": (12, 13), "EAN8": (7, 8), "ITF": (2, 255)}
+BARCODE_HRI = {"none": 0, "above": 1, "below": 2, "both": 3}
+RASTER_BARCODES = {        # Raster fallback via python-barcode
+    "UPCA": "upca", "EAN13": "ean13", "EAN8": "ean8", "CODE39": "code39",
+    "ITF": "itf", "CODABAR": "codabar", "CODE128": "code128"
+}
+
+def code_spec(kind, content, options):
+    """Validate QR/barcode options from a request into a hashable spec; raises ValueError"""
+    def number(name, default, low, high):
+        value = options.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            raise ValueError(f"'{name}' must be a whole number between {low} and {high}")
+        return value
+
+    content = str(content)
+    if kind == "qr":
+        ec = str(options.get("ec", "M")).upper()
+        if ec not in QR_ERROR_LEVELS:
+            raise ValueError("'ec' must be one of L, M, Q, H")
+        if len(content.encode("utf-8")) > QR_MAX_BYTES:
+            raise ValueError(f"QR content is too long (max {QR_MAX_BYTES} bytes)")
+        return ("qr", content, number("size", 6, 1, 16), ec)
+
+    symbology = str(options.get("symbology", "CODE128")).upper()
+    if symbology not in BARCODE_SYMBOLOGIES:
+        raise ValueError(f"Unsupported symbology '{symbology}'")
+    if not content.isascii() or not 1 <= len(content) <= 253:
+        raise ValueError("Barcode content must be 1-253 ASCII characters")
+    if symbology in BARCODE_DIGITS:
+        low, high = BARCODE_DIGITS[symbology]
+        if not content.isdigit() or not low <= len(content) <= high:
+            raise ValueError(f"{symbology} needs {low}-{high} digits")
+        if symbology == "ITF" and len(content) % 2:
+            raise ValueError("ITF needs an even number of digits")
+    if symbology == "CODE128" and len(content) + content.count("{") > 253:
+        raise ValueError("CODE128 content is too long ('{' counts twice)")
+    hri = str(options.get("hri", "below")).lower()
+    if hri not in BARCODE_HRI:
+        raise ValueError("'hri' must be one of none, above, below, both")
+    return ("barcode", content, symbology, number("height", 80, 1, 255), number("width", 3, 2, 6), hri)
+
+def check_raster_codes(mode, code):
+    """Raise ValueError for barcodes in a qr/barcode spec or parsed document that have no raster fallback"""
+    if mode == "document":
+        specs = [el[1] for el in code if el[0] in ("qr", "barcode")]
     else:
-        logo_bytes = image_to_escpos_bytes(logo_data, is_url=is_url)
+        specs = [code] if mode in ("qr", "barcode") else []
+    for spec in specs:
+        if spec[0] == "barcode" and spec[2] not in RASTER_BARCODES:
+            raise ValueError(f"{spec[2]} barcodes need native printer commands: not available with "
+                             f"\"render\": \"raster\" or on printers with \"native_codes\": false")
+
+def escpos_qr(content, size=6, ec="M"):
+    """Native QR code: GS ( k model 2, module size, error level, store, print"""
+    payload = content.encode("utf-8")
+    return b"".join([
+        b"\x1d(k\x04\x00\x31\x41\x32\x00",
+        b"\x1d(k\x03\x00\x31\x43" + bytes([size]),
+        b"\x1d(k\x03\x00\x31\x45" + bytes([QR_ERROR_LEVELS[ec]]),
+        b"\x1d(k" + struct.pack("<H", len(payload) + 3) + b"\x31\x50\x30" + payload,
+        b"\x1d(k\x03\x00\x31\x51\x30"
+    ])
 
-    commands = b"".join([
+def escpos_barcode(content, symbology="CODE128", height=80, width=3, hri="below"):
+    """Native 1D barcode: GS h / GS w / GS H settings, then GS k function B"""
+    payload = content.encode("ascii")
+    if symbology == "CODE128":
+        payload = b"{B" + payload.replace(b"{", b"{{")  # Code set B; "{{" is a literal brace
+    return b"".join([
+        b"\x1dh" + bytes([height]),
+        b"\x1dw" + bytes([width]),
+        b"\x1dH" + bytes([BARCODE_HRI[hri]]),
+        b"\x1dk" + bytes([BARCODE_SYMBOLOGIES[symbology], len(payload)]) + payload
+    ])
+
+def _qr_image(content, size, ec):
+    from PIL import Image
+    try:
+        import qrcode
+    except ImportError:
+        raise ValueError("Raster QR codes need the 'qrcode' package")
+    qr = qrcode.QRCode(error_correction=getattr(qrcode.constants, f"ERROR_CORRECT_{ec}"), border=2)
+    qr.add_data(content)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+    im = Image.new("1", (modules, modules), 1)
+    im.putdata([0 if cell else 1 for row in matrix for cell in row])
+    return im.resize((modules * size, modules * size), Image.NEAREST)
+
+def _barcode_image(content, symbology, height, width, hri):
+    from PIL import Image, ImageDraw
+    if symbology not in RASTER_BARCODES:
+        raise ValueError(f"No raster fallback for {symbology}")
+    try:
+        import barcode
+    except ImportError:
+        raise ValueError("Raster barcodes need the 'python-barcode' package")
+    cls = barcode.get_barcode_class(RASTER_BARCODES[symbology])
+    code = cls(content, add_checksum=False) if symbology == "CODE39" else cls(content)
+    bars = code.build()[0]
+
+    quiet = 10 * width
+    text_height = 14 if hri != "none" else 0
+    top = text_height if hri in ("above", "both") else 0
+    total = height + text_height * (2 if hri == "both" else 1 if text_height else 0)
+    im = Image.new("1", (len(bars) * width + 2 * quiet, total), 1)
+    draw = ImageDraw.Draw(im)
+    for i, bar in enumerate(bars):
+        if bar == "1":
+            x = quiet + i * width
+            draw.rectangle((x, top, x + width - 1, top + height - 1), fill=0)
+    if hri != "none":
+        label = code.get_fullcode()
+        text_x = max(0, (im.size[0] - 6 * len(label)) // 2)
+        if hri in ("above", "both"):
+            draw.text((text_x, 1), label, fill=0)
+        if hri in ("below", "both"):
+            draw.text((text_x, top + height + 1), label, fill=0)
+    return im
+
+@functools.lru_cache(maxsize=256)
+def raster_code(spec, elide=False, trim=False):
+    """Rasterised QR/barcode for printers without native support, cached by content"""
+    if spec[0] == "qr":
+        im = _qr_image(*spec[1:])
+    else:
+        im = _barcode_image(*spec[1:])
+    return b"".join(raster_bands(to_raster_image(im), elide=elide, trim=trim))
+
+def escpos_code(spec, native=True, raster=None):
+    """ESC/POS bytes for a code spec: native command, or the cached raster fallback"""
+    if not native:
+        return raster_code(spec, **(raster or {}))
+    if spec[0] == "qr":
+        return escpos_qr(*spec[1:])
+    return escpos_barcode(*spec[1:])
+
+def build_escpos_code(spec, native=True, cut=True, raster=None):
+    """A centred QR/barcode as a complete receipt"""
+    return b"".join([
         b"\x1B\x40",
         b"\x1B\x61\x01",
-        logo_bytes,
+        escpos_code(spec, native, raster),
         b"\x1B\x61\x00",
-        b"\n",
-        text.encode("utf-8"),
         b"\n\n\n",
-        b"\x1D\x56\x00"
+        b"\x1D\x56\x00" if cut else b""
     ])
-    return base64.b64encode(commands).decode("utf-8")
+
+# ===========================================
+# 🔹 Print documents (structured ESC/POS)
+# ===========================================
+DOCUMENT_MAX_ELEMENTS = 2000
+DOCUMENT_BUFFER_BYTES = 8 * 1024  # Initial output buffer, doubled as needed
+DOCUMENT_COLUMNS = 48             # Font A characters per line on 80 mm paper
+DOCUMENT_ALIGN = {"left": 0, "center": 1, "right": 2}
+DOCUMENT_STYLE = (0, False, 0, 1, 1, "a", False)  # align, bold, underline, width, height, font, invert
+
+def _document_align(el, default, what="'align'"):
+    """ESC a value of an element's (or column's) alignment"""
+    align = el.get("align", default)
+    if not isinstance(align, str) or align not in DOCUMENT_ALIGN:
+        raise ValueError(f"{what} must be one of left, center, right")
+    return DOCUMENT_ALIGN[align]
+
+def _document_style(el):
+    """Validate an element's text style into a hashable tuple"""
+    def scale(name):
+        value = el.get(name, 1)
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= 8:
+            raise ValueError(f"'{name}' must be between 1 and 8")
+        return value
+
+    underline = el.get("underline", 0)
+    if not isinstance(underline, int) or isinstance(underline, bool) or not 0 <= underline <= 2:
+        raise ValueError("'underline' must be 0, 1 or 2")
+    font = str(el.get("font", "a")).lower()
+    if font not in ("a", "b"):
+        raise ValueError("'font' must be a or b")
+    return (_document_align(el, "left"), bool(el.get("bold")), underline, scale("width"), scale("height"),
+            font, bool(el.get("invert")))
+
+def parse_document(elements):
+    """Validate a `document` job's element list into hashable tuples; raises ValueError.
+
+    Elements are objects with a `type`: text, columns, rule, feed, cut, image,
+    qr or barcode (see the API docs for their options).
+    """
+    if not isinstance(elements, list) or not elements:
+        raise ValueError("'data' must be a non-empty list of elements")
+    if len(elements) > DOCUMENT_MAX_ELEMENTS:
+        raise ValueError(f"Documents are limited to {DOCUMENT_MAX_ELEMENTS} elements")
+    parsed = []
+    for i, el in enumerate(elements):
+        kind = el.get("type") if isinstance(el, dict) else None
+        try:
+            if kind == "text":
+                parsed.append(("text", str(el.get("text", "")), _document_style(el)))
+            elif kind == "columns":
+                cols = el.get("columns")
+                if not isinstance(cols, list) or not cols or not all(isinstance(c, dict) for c in cols):
+                    raise ValueError("'columns' must be a list of objects")
+                cells = []
+                for c in cols:
+                    width = c.get("width")
+                    if width is not None and (not isinstance(width, int) or isinstance(width, bool) or width < 1):
+                        raise ValueError("column 'width' must be a positive integer")
+                    _document_align(c, "left", "column 'align'")
+                    cells.append((str(c.get("text", "")), width, c.get("align", "left")))
+                parsed.append(("columns", tuple(cells), _document_style(el)))
+            elif kind == "rule":
+                char = str(el.get("char", "-"))
+                if len(char) != 1:
+                    raise ValueError("'char' must be a single character")
+                parsed.append(("rule", char, _document_style(el)))
+            elif kind == "feed":
+                lines = el.get("lines", 1)
+                if not isinstance(lines, int) or isinstance(lines, bool) or not 1 <= lines <= 255:
+                    raise ValueError("'lines' must be between 1 and 255")
+                parsed.append(("feed", lines))
+            elif kind == "cut":
+                lines = el.get("feed", 3)
+                if not isinstance(lines, int) or isinstance(lines, bool) or not 0 <= lines <= 255:
+                    raise ValueError("'feed' must be between 0 and 255")
+                parsed.append(("cut", lines, bool(el.get("partial"))))
+            elif kind == "image":
+                data, url = el.get("data"), el.get("url")
+                if not (isinstance(data, str) and data) and not (isinstance(url, str) and url):
+                    raise ValueError("images need 'data' (base64) or 'url'")
+                parsed.append(("image", url or data, bool(url), _document_align(el, "center")))
+            elif kind in ("qr", "barcode"):
+                parsed.append((kind, code_spec(kind, el.get("data", ""), el), _document_align(el, "center")))
+            else:
+                raise ValueError(f"unknown type {kind!r}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Element {i}: {e}")
+    return parsed
+
+@functools.lru_cache(maxsize=512)
+def style_bytes(old, new):
+    """ESC/POS commands changing the text style from `old` to `new` (only what differs)"""
+    out = []
+    if old[0] != new[0]:
+        out.append(b"\x1B\x61" + bytes([new[0]]))
+    if old[1] != new[1]:
+        out.append(b"\x1B\x45" + bytes([new[1]]))
+    if old[2] != new[2]:
+        out.append(b"\x1B\x2D" + bytes([new[2]]))
+    if old[3:5] != new[3:5]:
+        out.append(b"\x1D\x21" + bytes([(new[3] - 1) << 4 | (new[4] - 1)]))
+    if old[5] != new[5]:
+        out.append(b"\x1B\x4D" + (b"\x01" if new[5] == "b" else b"\x00"))
+    if old[6] != new[6]:
+        out.append(b"\x1D\x42" + bytes([new[6]]))
+    return b"".join(out)
+
+@functools.lru_cache(maxsize=256)
+def static_element_bytes(el):
+    """Bytes of elements that do not depend on the printer (feed, cut)"""
+    if el[0] == "feed":
+        return b"\x1B\x64" + bytes([el[1]])
+    feed = b"\x1B\x64" + bytes([el[1]]) if el[1] else b""
+    return feed + (b"\x1D\x56\x01" if el[2] else b"\x1D\x56\x00")
+
+@functools.lru_cache(maxsize=32)
+def document_image(data, elide=False, trim=False):
+    """Raster of an inline document image, kept for the logos every receipt repeats"""
+    return b"".join(iter_image_to_escpos(data, is_url=data.startswith("data:image"), elide=elide, trim=trim))
+
+def line_columns(style, columns):
+    """Characters per line for a style (font B fits 4 characters in the width of 3)"""
+    if style[5] == "b":
+        columns = columns * 4 // 3
+    return max(1, columns // style[3])
+
+def layout_columns(cells, width):
+    """One line of fixed-width cells; cells without a width share what is left"""
+    fixed = sum(w for _, w, _ in cells if w)
+    free = [i for i, (_, w, _) in enumerate(cells) if not w]
+    share, extra = divmod(max(0, width - fixed), len(free)) if free else (0, 0)
+    line = []
+    for i, (text, w, align) in enumerate(cells):
+        if not w:
+            w = share + (1 if free.index(i) < extra else 0)
+        text = text.replace("\n", " ")[:w]
+        line.append(text.rjust(w) if align == "right" else text.center(w) if align == "center" else text.ljust(w))
+    return "".join(line)[:width].rstrip()
+
+class _EscposBuffer:
+    """Preallocated output buffer; the document is written into it in one pass"""
+    def __init__(self, size=DOCUMENT_BUFFER_BYTES):
+        self.buf = bytearray(size)
+        self.size = 0
+
+    def write(self, data):
+        end = self.size + len(data)
+        if end > len(self.buf):
+            self.buf.extend(bytes(max(end, 2 * len(self.buf)) - len(self.buf)))
+        self.buf[self.size:end] = data
+        self.size = end
+
+    def getvalue(self):
+        del self.buf[self.size:]
+        return self.buf
+
+def check_columns(columns):
+    """Validate a profile's characters per line; raises ValueError"""
+    if not isinstance(columns, int) or isinstance(columns, bool) or not 1 <= columns <= 255:
+        raise ValueError("'columns' must be a whole number between 1 and 255")
+    return columns
+
+def compile_document(printer_name, elements, codepage=None, native=None, raster=None):
+    """Compile parsed document elements to ESC/POS bytes for a printer.
+
+    Style commands are only sent when the style changes; text goes through
+    the printer's code pages, codes follow the printer profile unless
+    `native` overrides it.
+    """
+    profile = get_printer_profile(printer_name)
+    columns = profile.get("columns") or DOCUMENT_COLUMNS  # Checked when profiles load
+    if native is None:
+        native = profile.get("native_codes", True)
+    raster = raster or {}
+    out = _EscposBuffer()
+    out.write(b"\x1B\x40")
+    style = DOCUMENT_STYLE
+    for el in elements:
+        kind = el[0]
+        if kind in ("text", "columns", "rule"):
+            new = el[2]
+            if kind == "text":
+                text = el[1] if el[1].endswith("\n") else el[1] + "\n"
+            elif kind == "columns":
+                text = layout_columns(el[1], line_columns(new, columns)) + "\n"
+            else:
+                text = el[1] * line_columns(new, columns) + "\n"
+            out.write(style_bytes(style, new))
+            style = new
+            with job_phase("encode"):
+                out.write(encode_printer_text(printer_name, text, codepage))
+        elif kind in ("feed", "cut"):
+            out.write(static_element_bytes(el))
+        else:
+            # Images and codes are aligned like text, in the regular style
+            new = (el[-1],) + DOCUMENT_STYLE[1:]
+            out.write(style_bytes(style, new))
+            style = new
+            if kind == "image":
+                if el[2]:
+                    for band in iter_image_to_escpos(el[1], is_url=True, **raster):
+                        out.write(band)
+                else:
+                    out.write(document_image(el[1], **raster))
+            else:
+                with job_phase("render"):
+                    out.write(escpos_code(el[1], native, raster))
+                out.write(b"\n")
+    out.write(style_bytes(style, DOCUMENT_STYLE))
+    return out.getvalue()
 
 # ===========================================
 # 🔹 Printer list
 # ===========================================
+PRINTER_LIST_MAX_AGE = 2  # Seconds an enumeration is reused for /printers and lookups
+
+printer_list = {"printers": [], "by_name": {}, "fingerprint": None, "body": None, "etag": None, "version": 0,
+                "checked": None}
+printer_list_lock = threading.Condition()  # Notified whenever `version` changes
+printer_history = deque(maxlen=64)         # (version, printers, default) for /printers/watch diffs
+PRINTER_LIST_FIELDS = ("pPrinterName", "pPortName", "pDriverName", "pLocation", "pComment", "pShareName",
+                       "Status", "Attributes")
+
+def _printer_info(p, default):
+    return {
+        "Id": make_printer_id(p),
+        "Name": p.get("pPrinterName", ""),
+        "PortName": p.get("pPortName", ""),
+        "DriverName": p.get("pDriverName", ""),
+        "Location": p.get("pLocation", ""),
+        "Comment": p.get("pComment", ""),
+        "ShareName": p.get("pShareName", ""),
+        "Status": p.get("Status", 0),
+        "Attributes": p.get("Attributes", 0),
+        "IsDefault": (p.get("pPrinterName", "") == default),
+    }
+
+def get_printer_list(max_age=PRINTER_LIST_MAX_AGE):
+    """Current printer list with its serialized body and ETag.
+
+    Enumerates at most once per `max_age` seconds (concurrent callers share one
+    enumeration); the list, body and ETag are only rebuilt, and `version`
+    bumped, when the printers or the default printer actually changed.
+    """
+    global printer_list
+    with printer_list_lock:
+        checked = printer_list["checked"]
+        if checked is not None and time.monotonic() - checked < max_age:
+            return printer_list
+        flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
+        printers = win32print.EnumPrinters(flags, None, 2)
+        default = win32print.GetDefaultPrinter()
+        # Only the fields we publish: level-2 entries also carry DEVMODE objects that never compare equal
+        fingerprint = (default, tuple(tuple(p.get(k) for k in PRINTER_LIST_FIELDS) for p in printers))
+        if fingerprint == printer_list["fingerprint"]:
+            printer_list["checked"] = time.monotonic()
+            return printer_list
+        result = [_printer_info(p, default) for p in printers]
+        if stored_logos:
+            forget_reset_printers(printer_list["printers"], result)
+        body = json.dumps(result).encode("utf-8")
+        printer_list = {
+            "printers": result,
+            "by_name": {p["Name"]: p for p in result},
+            "fingerprint": fingerprint,
+            "body": body,
+            "etag": hashlib.sha1(body).hexdigest(),
+            "version": printer_list["version"] + 1,
+            "checked": time.monotonic()
+        }
+        printer_history.append((printer_list["version"], {p["Id"]: p for p in result}, default))
+        printer_list_lock.notify_all()
+        return printer_list
+
 @app.route("/printers", methods=["GET"])
 def list_printers():
-    flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
-    printers = win32print.EnumPrinters(flags, None, 2)
-    default = win32print.GetDefaultPrinter()
-    result = []
-    for p in printers:
-        info = {
-            "Id": make_printer_id(p),
-            "Name": p.get("pPrinterName", ""),
-            "PortName": p.get("pPortName", ""),
-            "DriverName": p.get("pDriverName", ""),
-            "Location": p.get("pLocation", ""),
-            "Comment": p.get("pComment", ""),
-            "ShareName": p.get("pShareName", ""),
-            "Status": p.get("Status", 0),
-            "Attributes": p.get("Attributes", 0),
-            "IsDefault": (p.get("pPrinterName", "") == default),
-        }
-        result.append(info)
-    return jsonify(result)
+    current = get_printer_list()
+    if request.args.get("scope") == "all":
+        return jsonify(current["printers"] + peer_printer_list())
+    response = Response(current["body"], mimetype="application/json")
+    response.set_etag(current["etag"])
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers[PEER_INSTANCE_HEADER] = instance_id
+    return response.make_conditional(request)
+
+# ===========================================
+# 🔹 Printer watch (long-poll)
+# ===========================================
+PRINTER_WATCH_POLL_SECONDS = 5     # Diffed poll interval; also catches default-printer changes
+PRINTER_WATCH_DEBOUNCE = 0.25      # Let a burst of spooler notifications settle
+PRINTER_WATCH_TIMEOUT = 30
+PRINTER_WATCH_MAX_TIMEOUT = 120
+PRINTER_CHANGE_PRINTER = 0x000000FF  # Add, set, delete printer and failed connection
+
+printer_watcher_started = False
+printer_watcher_lock = threading.Lock()
+
+def open_printer_change_waiter():
+    """wait(timeout) -> True on a spooler printer change, or None without notifications"""
+    try:
+        import win32event
+        server = win32print.OpenPrinter(None)
+        change = win32print.FindFirstPrinterChangeNotification(server, PRINTER_CHANGE_PRINTER, 0, None)
+    except Exception:
+        return None
+
+    def wait(timeout):
+        if win32event.WaitForSingleObject(change, int(timeout * 1000)) != win32event.WAIT_OBJECT_0:
+            return False
+        win32print.FindNextPrinterChangeNotification(change, None)  # Re-arm
+        return True
+    return wait
+
+def _watch_printers():
+    wait = open_printer_change_waiter()
+    print("✓ Printer watcher using " + ("spooler change notifications" if wait else "polling"))
+    while not flask_shutdown:
+        if wait:
+            try:
+                if wait(PRINTER_WATCH_POLL_SECONDS):
+                    time.sleep(PRINTER_WATCH_DEBOUNCE)
+            except Exception as e:
+                print(f"⚠️ Printer change notifications failed, polling instead: {e}")
+                wait = None
+        else:
+            time.sleep(PRINTER_WATCH_POLL_SECONDS)
+        try:
+            get_printer_list(0)
+        except Exception as e:
+            print(f"Error enumerating printers: {e}")
+
+def start_printer_watcher():
+    """Start the shared printer watcher once"""
+    global printer_watcher_started
+    with printer_watcher_lock:
+        if printer_watcher_started:
+            return
+        printer_watcher_started = True
+    threading.Thread(target=_watch_printers, daemon=True).start()
+
+def printer_diff(since):
+    """Changes between version `since` and the current list; None if `since` is no longer kept"""
+    old = next((entry for entry in printer_history if entry[0] == since), None)
+    if old is None:
+        return None
+    _, before, old_default = old
+    version, after, default = printer_history[-1]
+    return {
+        "version": version,
+        "added": [p for pid, p in after.items() if pid not in before],
+        "removed": [p for pid, p in before.items() if pid not in after],
+        "updated": [p for pid, p in after.items() if pid in before and before[pid] != p],
+        "default": default if default != old_default else None
+    }
+
+@app.route("/printers/watch", methods=["GET"])
+def watch_printers():
+    """Block until the printer list differs from version `since`, then return the diff"""
+    start_printer_watcher()
+    try:
+        since = request.args.get("since", type=int)
+        timeout = min(float(request.args.get("timeout", PRINTER_WATCH_TIMEOUT)), PRINTER_WATCH_MAX_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "Invalid 'timeout'"}), 400
+
+    current = get_printer_list()
+    if since is None:
+        return jsonify({"version": current["version"], "printers": current["printers"]})
+
+    with printer_list_lock:
+        changed = printer_list_lock.wait_for(lambda: printer_list["version"] != since, max(timeout, 0))
+        diff = printer_diff(since) if changed else None
+        current = printer_list
+    if not changed:
+        return jsonify({"version": since, "changed": False})
+    if diff is None:
+        # Too far behind (or a version from before a restart): start over from the full list
+        return jsonify({"version": current["version"], "changed": True, "reset": True,
+                        "printers": current["printers"]})
+    diff["changed"] = True
+    return jsonify(diff)
+
+# ===========================================
+# 🔹 Peer forwarding (other printlink instances)
+# ===========================================
+PEER_ANNOUNCE_PORT = 9199
+PEER_ANNOUNCE_SECONDS = 10
+PEER_EXPIRE_SECONDS = 3 * PEER_ANNOUNCE_SECONDS
+PEER_REFRESH_SECONDS = 5
+PEER_MIN_REFRESH_SECONDS = 1     # On-demand refreshes (unknown printer) at most this often
+PEER_TIMEOUT = (3, 120)          # Connect, read: the peer answers once the job is spooled
+PEER_POOL_SIZE = 16              # Keep-alive connections per peer
+PEER_FORWARD_HEADER = "X-Printlink-Forwarded"  # Forwarded jobs are never forwarded again
+PEER_INSTANCE_HEADER = "X-Printlink-Instance"
+
+instance_id = uuid.uuid4().hex[:12]
+static_peers = []          # "host:port" from configuration
+discovered_peers = {}      # "host:port" -> (instance, printer list version, last announcement)
+peer_registry = {}         # "host:port" -> {"instance", "printers", "etag", "checked", "error"}
+peer_lock = threading.Lock()
+peer_refresh_lock = threading.Lock()
+peer_refreshed = 0.0
+peer_wakeup = threading.Event()
+announce_now = threading.Event()
+peer_session = None
+peer_services_started = False
+
+def _peer_address(value):
+    """'http://host:port/' or 'host' -> 'host:port'"""
+    value = str(value).strip().rstrip("/")
+    value = value.split("://", 1)[-1]
+    return value if ":" in value else f"{value}:9100"
+
+def load_peers():
+    """Load the static peer list from configuration and start the peer threads if needed"""
+    global static_peers
+    peers = []
+    config = get_config()
+    try:
+        raw = (config.get("peers") or "").strip()
+        values = json.loads(raw) if raw.startswith("[") else raw.split(",")
+        peers = [_peer_address(v) for v in values if str(v).strip()]
+    except Exception as e:
+        print(f"Error loading peers: {e}")
+    with peer_lock:
+        static_peers = peers
+    peer_wakeup.set()
+    if peers or config.get("peer_discovery") == "true":
+        start_peer_services(config.get("peer_discovery") == "true")
+
+def get_peer_session():
+    """One requests.Session for all peers: keep-alive connections are reused between jobs"""
+    global peer_session
+    if peer_session is None:
+        import requests
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=PEER_POOL_SIZE, pool_maxsize=PEER_POOL_SIZE)
+        session.mount("http://", adapter)
+        peer_session = session
+    return peer_session
+
+def peer_addresses():
+    now = time.monotonic()
+    with peer_lock:
+        discovered = [p for p, (_, _, seen) in discovered_peers.items() if now - seen < PEER_EXPIRE_SECONDS]
+        return list(dict.fromkeys(static_peers + discovered))
+
+def refresh_peer(peer):
+    """Fetch a peer's printer list (a conditional GET, so unchanged lists cost a 304)"""
+    entry = peer_registry.get(peer) or {"instance": None, "printers": [], "etag": None, "checked": None, "error": None}
+    headers = {"If-None-Match": f'"{entry["etag"]}"'} if entry["etag"] else {}
+    try:
+        r = get_peer_session().get(f"http://{peer}/printers", headers=headers, timeout=PEER_TIMEOUT[0])
+        if r.status_code == 200:
+            entry = dict(entry, printers=r.json(), etag=r.headers.get("ETag", "").strip('"') or None)
+        elif r.status_code != 304:
+            raise ValueError(f"HTTP {r.status_code}")
+        entry = dict(entry, instance=r.headers.get(PEER_INSTANCE_HEADER), error=None)
+    except Exception as e:
+        entry = dict(entry, printers=[], etag=None, error=str(e))
+    entry["checked"] = time.monotonic()
+    with peer_lock:
+        peer_registry[peer] = entry
+
+def refresh_peers(min_age=0):
+    """Refresh every peer's printer list; concurrent callers share one pass"""
+    global peer_refreshed
+    with peer_refresh_lock:
+        if time.monotonic() - peer_refreshed < min_age:
+            return
+        peers = peer_addresses()
+        for peer in peers:
+            refresh_peer(peer)
+        with peer_lock:
+            for peer in set(peer_registry) - set(peers):
+                del peer_registry[peer]
+        peer_refreshed = time.monotonic()
+
+def _refresh_peers_loop():
+    while not flask_shutdown:
+        refresh_peers()
+        peer_wakeup.wait(PEER_REFRESH_SECONDS)
+        peer_wakeup.clear()
+
+def _announce_loop():
+    """Broadcast this instance on the LAN: its port and printer list version"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    with sock:
+        while not flask_shutdown:
+            message = json.dumps({"app": "printlink", "instance": instance_id, "port": HTTP_PORT,
+                                  "version": printer_list["version"]}).encode("utf-8")
+            try:
+                sock.sendto(message, ("255.255.255.255", PEER_ANNOUNCE_PORT))
+            except OSError as e:
+                print(f"⚠️ Peer announcement failed: {e}")
+            announce_now.wait(PEER_ANNOUNCE_SECONDS)
+            announce_now.clear()
+
+def _listen_announcements():
+    """Record instances announcing themselves; refresh when one is new or its printers changed"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Several instances on one host
+    sock.bind(("", PEER_ANNOUNCE_PORT))
+    sock.settimeout(PEER_ANNOUNCE_SECONDS)  # Wakes up to notice shutdown
+    with sock:
+        while not flask_shutdown:
+            try:
+                data, (host, _) = sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            try:
+                message = json.loads(data)
+                if message.get("app") != "printlink" or message.get("instance") == instance_id:
+                    continue
+                peer = f"{host}:{int(message['port'])}"
+            except (ValueError, KeyError, TypeError):
+                continue
+            with peer_lock:
+                known = discovered_peers.get(peer)
+                discovered_peers[peer] = (message["instance"], message.get("version"), time.monotonic())
+            if known is None or known[0] != message["instance"]:
+                announce_now.set()  # Answer newcomers so they need not wait for the next round
+            if known is None or known[:2] != (message["instance"], message.get("version")):
+                peer_wakeup.set()
+
+def start_peer_services(discovery=False):
+    """Start refreshing peer printer lists (and LAN discovery) once"""
+    global peer_services_started
+    with peer_lock:
+        if peer_services_started:
+            return
+        peer_services_started = True
+    threading.Thread(target=_refresh_peers_loop, daemon=True).start()
+    if discovery:
+        threading.Thread(target=_announce_loop, daemon=True).start()
+        threading.Thread(target=_listen_announcements, daemon=True).start()
+        print(f"✓ Announcing on UDP {PEER_ANNOUNCE_PORT} as {instance_id}")
+
+def _peer_entries():
+    """(address, registry entry) of each other instance, once even when known by several addresses"""
+    seen = {instance_id}
+    entries = []
+    with peer_lock:
+        for peer, entry in peer_registry.items():
+            if entry["instance"] not in seen:
+                seen.add(entry["instance"])
+                entries.append((peer, entry))
+    return entries
+
+def forwarded_by_peer():
+    """Whether the current request is a job forwarded by a known peer instance.
+
+    Instance ids are public (/peers, response headers), so the request must
+    also come from the address that instance is registered under.
+    """
+    sender = request.headers.get(PEER_FORWARD_HEADER)
+    if not sender:
+        return False
+    with peer_lock:
+        return any(entry["instance"] == sender and peer.rsplit(":", 1)[0].strip("[]") == request.remote_addr
+                   for peer, entry in peer_registry.items())
+
+def find_peer_printer(identifier, refresh=False):
+    """Address of the peer that owns a printer (by name, then Id), or None"""
+    if refresh and peer_addresses():
+        refresh_peers(PEER_MIN_REFRESH_SECONDS)
+    entries = _peer_entries()
+    for key in ("Name", "Id"):
+        for peer, entry in entries:
+            if any(p.get(key) == identifier for p in entry["printers"]):
+                return peer
+    return None
+
+def peer_printer_list():
+    """Printers of every peer, each tagged with its "Peer" address"""
+    return [dict(p, Peer=peer) for peer, entry in _peer_entries() for p in entry["printers"]]
+
+class _ForwardBody:
+    """A /print body whose streamed payload is base64-encoded again as it is sent"""
+    def __init__(self, fields, payload):
+        head = json.dumps({k: v for k, v in fields.items() if k != "data"})
+        self.prefix = (head[:-1] + (", " if len(head) > 2 else "") + '"data": "').encode("utf-8")
+        self.payload = payload
+        self.length = len(self.prefix) + 4 * -(-payload.size // 3) + 2
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.prefix
+        pending = b""
+        for chunk in self.payload:
+            pending += bytes(chunk)
+            cut = len(pending) - len(pending) % 3
+            yield base64.b64encode(pending[:cut])
+            pending = pending[cut:]
+        yield base64.b64encode(pending) + b'"}'
+
+def forward_print(peer, fields):
+    """Send a /print job to the peer that owns the printer; returns (response body, HTTP status)"""
+    payload = fields.get("data")
+    if isinstance(payload, StreamedPayload):
+        body = _ForwardBody(fields, payload)
+    else:
+        body = json.dumps(fields).encode("utf-8")
+    try:
+        with job_phase("forward"):
+            r = get_peer_session().post(f"http://{peer}/print", data=body, timeout=PEER_TIMEOUT, headers={
+                "Content-Type": "application/json", PEER_FORWARD_HEADER: instance_id})
+        try:
+            result = r.json()
+        except ValueError:
+            result = {"error": r.text[:200]}
+    except Exception as e:
+        with peer_lock:
+            peer_registry.pop(peer, None)  # Until the next refresh
+        return {"error": f"Peer {peer} unreachable: {e}"}, 502
+    result["peer"] = peer
+    return result, r.status_code
+
+@app.route("/peers", methods=["GET"])
+def list_peers():
+    """This instance's id and what it knows about its peers"""
+    now = time.monotonic()
+    with peer_lock:
+        peers = [{
+            "peer": peer,
+            "instance": e["instance"],
+            "self": e["instance"] == instance_id,
+            "printers": len(e["printers"]),
+            "error": e["error"],
+            "checked_s_ago": round(now - e["checked"], 1) if e["checked"] else None,
+            "source": "static" if peer in static_peers else "discovered"
+        } for peer, e in peer_registry.items()]
+    return jsonify({"instance": instance_id, "port": HTTP_PORT, "peers": peers})
 
 # ===========================================
 # 🔹 Resolve printer by ID
 # ===========================================
-def resolve_printer(identifier):
-    flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
-    printers = win32print.EnumPrinters(flags, None, 2)
+def _find_printer(printers, identifier):
     for p in printers:
-        name = p.get("pPrinterName") or ""
-        if identifier == name:
-            return name
+        if identifier == p["Name"]:
+            return p["Name"]
     for p in printers:
-        if identifier == make_printer_id(p):
-            return p.get("pPrinterName")
+        if identifier == p["Id"]:
+            return p["Name"]
+    return None
+
+def resolve_target(identifier, peers=True):
+    """(local printer name, None) or, with `peers`, (None, address of the peer that owns it).
+
+    Local printers win; peers are asked before the local list is enumerated again.
+    """
+    for max_age in (PRINTER_LIST_MAX_AGE, 0):  # Re-enumerate once before giving up
+        name = _find_printer(get_printer_list(max_age)["printers"], identifier)
+        if name:
+            return name, None
+        if peers:
+            peer = find_peer_printer(identifier, refresh=max_age == 0)
+            if peer:
+                return None, peer
     raise ValueError("Printer not found.")
 
+# ===========================================
+# 🔹 Printer pools (least-loaded routing)
+# ===========================================
+POOL_PREFIX = "pool:"
+POOL_OFFLINE_SECONDS = 30
+PRINTER_STATUS_OFFLINE = 0x00000080
+PRINTER_ATTRIBUTE_WORK_OFFLINE = 0x00000400
+
+printer_pools = {}          # pool name -> list of member identifiers (from config)
+pool_members = {}           # pool name -> list of resolved printer names
+pool_members_version = None # Printer list version pool_members was resolved against
+printer_load = {}           # printer name -> jobs currently in flight
+printer_offline_until = {}  # printer name -> monotonic time until which it is skipped
+pool_lock = threading.Lock()
+
+def load_pools():
+    """Load printer pools from configuration and drop resolved members"""
+    global printer_pools
+    pools = {}
+    try:
+        raw = get_config().get("pools") or "{}"
+        for name, members in json.loads(raw).items():
+            if isinstance(members, str):
+                members = [members]
+            pools[str(name)] = [str(m) for m in members if m]
+    except Exception as e:
+        print(f"Error loading printer pools: {e}")
+    with pool_lock:
+        printer_pools = pools
+        pool_members.clear()
+
+def printer_offline(p):
+    """Whether a printer list entry is reported offline by the spooler"""
+    return bool(p["Status"] & PRINTER_STATUS_OFFLINE or p["Attributes"] & PRINTER_ATTRIBUTE_WORK_OFFLINE)
+
+def _resolve_pool(pool, current=None):
+    """Resolve pool members to printer names (cached until the printer list changes)"""
+    global pool_members_version
+    current = current or get_printer_list()
+    with pool_lock:
+        if pool_members_version != current["version"]:
+            pool_members.clear()
+            pool_members_version = current["version"]
+        members = pool_members.get(pool)
+    if members is not None:
+        return members
+    identifiers = printer_pools.get(pool)
+    if identifiers is None:
+        raise ValueError("Pool not found.")
+
+    by_name = current["by_name"]
+    by_id = {p["Id"]: p for p in current["printers"]}
+    members = []
+    for ident in identifiers:
+        p = by_name.get(ident) or by_id.get(ident)
+        if p is None:
+            print(f"⚠️ Pool '{pool}': printer '{ident}' not found")
+            continue
+        name = p["Name"]
+        if name in members:
+            continue
+        members.append(name)
+    with pool_lock:
+        pool_members[pool] = members
+    return members
+
+def acquire_pool_member(pool, exclude=()):
+    """Pick the online pool member with the fewest jobs in flight and reserve it.
+
+    Members are looked up in the cached printer list, so a member the
+    spooler reports offline (or that was removed) is skipped.
+    Returns None when every member is offline or excluded.
+    """
+    current = get_printer_list()
+    members = _resolve_pool(pool, current)
+    by_name = current["by_name"]
+    now = time.monotonic()
+    with pool_lock:
+        best = None
+        for name in members:
+            p = by_name.get(name)
+            if (name in exclude or p is None or printer_offline(p)
+                    or printer_offline_until.get(name, 0) > now):
+                continue
+            if best is None or printer_load.get(name, 0) < printer_load.get(best, 0):
+                best = name
+        if best is not None:
+            printer_load[best] = printer_load.get(best, 0) + 1
+        return best
+
+def acquire_printer(printer_name):
+    """Count a job in flight for a printer"""
+    with pool_lock:
+        printer_load[printer_name] = printer_load.get(printer_name, 0) + 1
+
+def release_printer(printer_name):
+    """Finish a job in flight for a printer"""
+    with pool_lock:
+        printer_load[printer_name] = max(0, printer_load.get(printer_name, 0) - 1)
+
+def mark_printer_offline(printer_name):
+    """Skip a printer in pool routing for a while after a spooler error"""
+    printer_offline_until[printer_name] = time.monotonic() + POOL_OFFLINE_SECONDS
+    publish_event("printer", {"printer": printer_name, "state": "offline",
+                              "retry_in": POOL_OFFLINE_SECONDS})
+
+# ===========================================
+# 🔹 Printer profiles (per-printer capabilities)
+# ===========================================
+printer_profiles = {}          # identifier (name, id or "*") -> profile dict (from config)
+resolved_profiles = {}         # printer name -> merged profile
+profiles_lock = threading.Lock()
+
+PROFILE_CHECKS = {         # Profile values that would otherwise fail every job at print time
+    "image_paper": lambda value: parse_paper(value),
+    "image_dpi": lambda value: check_dpi(value, "image_dpi"),
+    "columns": lambda value: check_columns(value)
+}
+
+def _checked_profile(ident, profile):
+    """A profile without the values that fail validation, each reported"""
+    for key, check in PROFILE_CHECKS.items():
+        if key in profile:
+            try:
+                check(profile[key])
+            except ValueError as e:
+                print(f"⚠️ Printer profile '{ident}': ignoring {key}: {e}")
+                profile = {k: v for k, v in profile.items() if k != key}
+    return profile
+
+def load_printer_profiles():
+    """Load per-printer profiles from configuration and drop resolved entries"""
+    global printer_profiles
+    profiles = {}
+    try:
+        raw = get_config().get("printer_profiles") or "{}"
+        for ident, profile in json.loads(raw).items():
+            if isinstance(profile, dict):
+                profiles[str(ident)] = _checked_profile(str(ident), profile)
+    except Exception as e:
+        print(f"Error loading printer profiles: {e}")
+    with profiles_lock:
+        printer_profiles = profiles
+        resolved_profiles.clear()
+
+def get_printer_profile(printer_name):
+    """Profile for a printer: the "*" defaults overlaid with its own entry by name or Id"""
+    profile = resolved_profiles.get(printer_name)
+    if profile is not None:
+        return profile
+    profiles = printer_profiles
+    profile = dict(profiles.get("*", {}))
+    own = profiles.get(printer_name)
+    if own is None and len(profiles) > ("*" in profiles):
+        # Entries keyed by Id need the printer's port and driver
+        for p in get_printer_list()["printers"]:
+            if p["Name"] == printer_name:
+                own = profiles.get(p["Id"])
+                break
+    profile.update(own or {})
+    with profiles_lock:
+        resolved_profiles[printer_name] = profile
+    return profile
+
+# ===========================================
+# 🔹 Text encoding (ESC/POS code pages)
+# ===========================================
+# ESC t n values for the code pages most ESC/POS printers ship with
+ESCPOS_CODEPAGES = {
+    "cp437": 0, "cp850": 2, "cp860": 3, "cp863": 4, "cp865": 5,
+    "cp857": 13, "cp737": 14, "iso8859_7": 15, "cp1252": 16, "cp866": 17,
+    "cp852": 18, "cp858": 19, "iso8859_2": 39, "iso8859_15": 40,
+    "cp1250": 45, "cp1251": 46, "cp1253": 47, "cp1254": 48
+}
+DEFAULT_CODEPAGES = ("cp437", "cp858", "cp852", "cp866", "cp1252")
+ENCODE_CACHE_CHARS = 1024      # Strings up to this length are cached
+
+@functools.lru_cache(maxsize=64)
+def codepage_tables(codepages):
+    """Precompute lookup tables for an ordered tuple of code pages.
+
+    Returns (char -> frozenset of pages containing it, page -> regex matching
+    the first character the page can't encode, page -> charmap encoder).
+    """
+    char_pages = {}
+    stoppers = {None: re.compile("[^\x00-\x7f]")}
+    encoders = {None: codecs.lookup("ascii").encode}
+    for page in codepages:
+        chars = []
+        for byte in range(0x80, 0x100):
+            try:
+                ch = bytes([byte]).decode(page)
+            except UnicodeDecodeError:
+                continue
+            if ord(ch) >= 0x80:
+                chars.append(re.escape(ch))
+                char_pages[ch] = char_pages.get(ch, frozenset()) | {page}
+        stoppers[page] = re.compile(f"[^\\x00-\\x7f{''.join(chars)}]")
+        encoders[page] = codecs.lookup(page).encode
+    return char_pages, stoppers, encoders
+
+def _encode_runs(text, codepages):
+    """Encode `text` as runs of single code pages with ESC t between them.
+
+    Each run is found with one regex search and encoded by the code page's
+    C charmap, so no Python code runs per character. When a character
+    forces a switch, the page that encodes the longest stretch ahead is
+    chosen, which keeps the number of switches minimal.
+    """
+    char_pages, stoppers, encoders = codepage_tables(codepages)
+    out = []
+    page = None  # Printer's current page is unknown until we switch
+    pos = 0
+    end_of_text = len(text)
+    stop = stoppers[None].search(text)
+    while True:
+        end = stop.start() if stop else end_of_text
+        if end > pos:
+            out.append(encoders[page](text[pos:end])[0])
+        if stop is None:
+            break
+        pages = char_pages.get(text[end])
+        if pages is None:
+            out.append(b"?")  # Not in any of the printer's code pages
+            pos = end + 1
+            stop = stoppers[page].search(text, pos)
+            continue
+        best, stop, best_reach = None, None, -1
+        for candidate in codepages:
+            if candidate in pages:
+                ahead = stoppers[candidate].search(text, end)
+                reach = ahead.start() if ahead else end_of_text
+                if reach > best_reach:
+                    best, stop, best_reach = candidate, ahead, reach
+        out.append(b"\x1b\x74" + bytes([ESCPOS_CODEPAGES[best]]))
+        page = best
+        pos = end
+    return b"".join(out)
+
+_encode_runs_cached = functools.lru_cache(maxsize=2048)(_encode_runs)
+
+def encode_escpos_text(text, codepages=DEFAULT_CODEPAGES):
+    """Encode text for an ESC/POS printer using its code pages instead of UTF-8.
+
+    ESC t is emitted only when the code page has to change. Short strings
+    (headers, item names, footers) are cached since they repeat across jobs.
+    """
+    if text.isascii():
+        return text.encode("ascii")  # Same bytes in every code page, no switch needed
+    if len(text) <= ENCODE_CACHE_CHARS:
+        return _encode_runs_cached(text, codepages)
+    return _encode_runs(text, codepages)
+
+def encode_printer_text(printer_name, text, codepage=None):
+    """Encode text for a printer: a request's `codepage` wins over the printer profile"""
+    if codepage in ("utf-8", "utf8"):
+        return text.encode("utf-8")
+    if codepage in ESCPOS_CODEPAGES:
+        return encode_escpos_text(text, (codepage,))
+    if codepage:
+        raise ValueError(f"Unsupported codepage '{codepage}'")
+    if text.isascii():
+        return text.encode("ascii")
+    codepages = get_printer_profile(printer_name).get("codepages") or DEFAULT_CODEPAGES
+    if isinstance(codepages, str):
+        codepages = [codepages]
+    if list(codepages) == ["utf-8"]:
+        return text.encode("utf-8")
+    return encode_escpos_text(text, tuple(p for p in codepages if p in ESCPOS_CODEPAGES))
+
+# ===========================================
+# 🔹 Image preprocessing (printto jobs)
+# ===========================================
+PAPER_SIZES = {  # Inches, portrait
+    "4x6": (4, 6), "4x4": (4, 4), "2x1": (2, 1), "a4": (8.27, 11.69), "a5": (5.83, 8.27),
+    "a6": (4.13, 5.83), "letter": (8.5, 11)
+}
+PAPER_CUSTOM = re.compile(r"^(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)$")  # "<width>x<height>" in inches
+IMAGE_DPI_RANGE = (72, 1200)
+IMAGE_CACHE_ENTRIES = 32
+IMAGE_JPEG_QUALITY = 90
+
+image_cache = {}     # (source sha1, paper, dpi) -> prepared file, oldest first
+image_cache_dir = None
+image_cache_lock = threading.Lock()
+
+def parse_paper(paper):
+    """Paper name or "<w>x<h>" (inches) -> (width, height) in inches; raises ValueError"""
+    if not isinstance(paper, str):
+        raise ValueError("'paper' must be a string, e.g. \"4x6\"")
+    paper = paper.strip().lower()
+    if paper in PAPER_SIZES:
+        return PAPER_SIZES[paper]
+    m = PAPER_CUSTOM.match(paper)
+    if not m or not float(m.group(1)) or not float(m.group(2)):
+        raise ValueError(f"Unknown paper '{paper}' (use {', '.join(PAPER_SIZES)} or <width>x<height> in inches)")
+    return float(m.group(1)), float(m.group(2))
+
+def check_dpi(dpi, name="dpi"):
+    """Validate an image DPI (a whole number in IMAGE_DPI_RANGE); raises ValueError"""
+    if not isinstance(dpi, int) or isinstance(dpi, bool) or not IMAGE_DPI_RANGE[0] <= dpi <= IMAGE_DPI_RANGE[1]:
+        raise ValueError(f"'{name}' must be a whole number between {IMAGE_DPI_RANGE[0]} and {IMAGE_DPI_RANGE[1]}")
+    return dpi
+
+def image_target(printer_name, paper=None, dpi=None):
+    """(paper, dpi) to downscale image jobs to, from the request or the printer profile; None to send as is"""
+    profile = get_printer_profile(printer_name)
+    paper = paper or profile.get("image_paper")
+    if not paper:
+        return None
+    return str(paper).lower(), int(dpi or profile.get("image_dpi") or 300)
+
+def downscale_image(source, dest, size):
+    """Fit an image file into `size` pixels (either orientation), upright, without metadata, as JPEG"""
+    from PIL import Image, ImageOps
+    with Image.open(source) as im:
+        longest = max(size)
+        im.draft("RGB", (longest, longest))  # JPEG: decode at 1/2, 1/4 or 1/8 scale when that is still big enough
+        im = ImageOps.exif_transpose(im)
+        portrait = im.size[1] >= im.size[0]
+        box = (min(size), max(size)) if portrait else (max(size), min(size))
+        im.thumbnail(box, Image.LANCZOS, reducing_gap=3.0)  # Never enlarges
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        im.save(dest, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)  # No exif/icc: metadata stripped
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def prepared_image(source, paper, dpi):
+    """Path of `source` downscaled for paper/dpi, from the cache when this image was seen before"""
+    global image_cache_dir
+    width, height = parse_paper(paper)
+    with job_phase("hash"):
+        key = (_file_sha1(source), paper, dpi)
+    with image_cache_lock:
+        path = image_cache.pop(key, None)
+        if path is not None:
+            image_cache[key] = path  # Most recently used last
+            return path
+        if image_cache_dir is None:
+            image_cache_dir = tempfile.mkdtemp(prefix="printlink-images-")
+    path = os.path.join(image_cache_dir, f"{key[0]}-{paper}-{dpi}.jpg")
+    size = (round(width * dpi), round(height * dpi))
+    pool = get_raster_pool() if os.path.getsize(source) >= PREPROCESS_POOL_MIN_BYTES else None
+    # Written aside and renamed, so a concurrent job for the same image never reads a partial file
+    fd, part = tempfile.mkstemp(suffix=".part", dir=image_cache_dir)
+    os.close(fd)
+    try:
+        with job_phase("preprocess"):
+            run_in_pool(pool, downscale_image, source, part, size)
+        try:
+            os.replace(part, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            os.remove(part)  # Windows: the same image, prepared by another job, is open for printing
+    except Exception:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    with image_cache_lock:
+        image_cache[key] = path
+        while len(image_cache) > IMAGE_CACHE_ENTRIES:
+            # Removed later, a printing application may still be reading it
+            schedule_remove(image_cache.pop(next(iter(image_cache))))
+    return path
+
 # ===========================================
 # 🔹 Print helpers
 # ===========================================
-def _print_text(printer_name, text):
-    h = win32print.OpenPrinter(printer_name)
+def _spool_chunks(printer_name, chunks, doc_name="RawPrintJob"):
+    """Send byte chunks to a printer as one RAW spool document, writing each as it is produced"""
+    with job_phase("open"):
+        h = win32print.OpenPrinter(printer_name)
     try:
-        win32print.StartDocPrinter(h, 1, ("TextJob", None, "RAW"))
-        win32print.StartPagePrinter(h)
-        win32print.WritePrinter(h, text.encode("utf-8"))
-        win32print.EndPagePrinter(h)
-        win32print.EndDocPrinter(h)
+        win32print.StartDocPrinter(h, 1, (doc_name, None, "RAW"))
+        try:
+            win32print.StartPagePrinter(h)
+            for chunk in chunks:
+                with job_phase("write"):
+                    win32print.WritePrinter(h, chunk)
+        except Exception:
+            win32print.AbortPrinter(h)
+            raise
+        with job_phase("end"):
+            win32print.EndPagePrinter(h)
+            win32print.EndDocPrinter(h)
     finally:
         win32print.ClosePrinter(h)
 
-def _print_raw(printer_name, b64data):
-    data = base64.b64decode(b64data)
-    h = win32print.OpenPrinter(printer_name)
+def find_sumatra():
+    """Find SumatraPDF.exe (bundled, next to the executable, or installed); None if missing"""
+    global sumatra_path
+    if sumatra_path is not False:
+        return sumatra_path
+    base_dir = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else os.path.abspath(__file__))
+    search_paths = [os.path.join(base_dir, "SumatraPDF.exe")]
+    if hasattr(sys, '_MEIPASS'):
+        search_paths.append(os.path.join(sys._MEIPASS, "SumatraPDF.exe"))
+    search_paths.append(os.path.join(os.getcwd(), "SumatraPDF.exe"))
+    for env in ("ProgramFiles", "ProgramFiles(x86)", "LOCALAPPDATA"):
+        if os.environ.get(env):
+            search_paths.append(os.path.join(os.environ[env], "SumatraPDF", "SumatraPDF.exe"))
+    sumatra_path = next((path for path in search_paths if os.path.exists(path)), None)
+    if sumatra_path:
+        print(f"✓ Found SumatraPDF.exe at: {sumatra_path}")
+    return sumatra_path
+
+sumatra_path = False  # Not searched yet
+
+def _print_file(printer_name, path, copies=1, pages=None):
+    """Print a PDF/image file; returns warnings about options that could not be honored.
+
+    Copies and page ranges are handed to SumatraPDF in a single launch when it
+    is available; otherwise the shell "printto" verb is used once per copy.
+    """
+    sumatra = find_sumatra() if copies > 1 or pages else None
+    if sumatra:
+        settings = ",".join(filter(None, [pages, f"{copies}x" if copies > 1 else None]))
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = 0  # SW_HIDE
+        with job_phase("shell_execute"):
+            subprocess.Popen([sumatra, "-print-to", printer_name, "-print-settings", settings,
+                              "-silent", path], shell=False, startupinfo=startupinfo)
+        return []
+
+    import win32api
+    warnings = []
+    if pages:
+        warnings.append("'pages' ignored: SumatraPDF.exe not found")
+    with job_phase("shell_execute"):
+        for _ in range(copies):
+            win32api.ShellExecute(0, "printto", path, f'"{printer_name}"', ".", 0)
+    return warnings
+
+def _write_temp_file(data, suffix):
+    """Write a URL's content or base64 data to a temp file and return its path"""
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        if data.startswith("http"):
+            import requests
+            with job_phase("fetch"):
+                r = requests.get(data)
+            with job_phase("temp_file"):
+                tmp.write(r.content)
+        else:
+            with job_phase("decode"):
+                decoded = base64.b64decode(data)
+            with job_phase("temp_file"):
+                tmp.write(decoded)
+    finally:
+        tmp.close()
+    return tmp.name
+
+def render_job(printer_name, mode, content, logo=None, logo_url=None, codepage=None, stream=False,
+               code=None, native=None, cut=True, paper=None, dpi=None):
+    """Decode and render a job once.
+
+    RAW modes become {"doc", "chunks"}; PDF and image jobs become {"path"} of
+    a temp file. With `stream` the logo raster is left as a generator so it
+    is written while it is produced; otherwise the chunks are materialised
+    so they can be sent several times (copies, failover). Image jobs for a
+    paper size are downscaled first and {"cached": True} marks the shared file.
+    `code` is the parsed spec of qr/barcode and document jobs.
+    """
+    target = image_target(printer_name, paper, dpi) if mode == "image" else None
+    if target:
+        source = content.path if isinstance(content, StreamedPayload) else _write_temp_file(content, ".jpg")
+        try:
+            return {"path": prepared_image(source, *target), "cached": True}
+        finally:
+            if not isinstance(content, StreamedPayload):
+                schedule_remove(source, 0)
+    if mode == "text":
+        with job_phase("encode"):
+            return {"doc": "TextJob", "chunks": [encode_printer_text(printer_name, content, codepage)]}
+    if isinstance(content, StreamedPayload):
+        # Decoded while the body was read
+        return {"doc": "RawPrintJob", "chunks": content} if content.path is None else {"path": content.path}
+    if mode == "raw":
+        with job_phase("decode"):
+            return {"doc": "RawPrintJob", "chunks": [base64.b64decode(content)]}
+    if mode == "document":
+        return {"doc": "DocumentJob", "chunks": [compile_document(printer_name, code, codepage, native,
+                                                                 raster_options(printer_name))]}
+    if mode in ("qr", "barcode"):
+        if native is None:
+            native = get_printer_profile(printer_name).get("native_codes", True)
+        with job_phase("render"):
+            return {"doc": "CodeJob", "chunks": [build_escpos_code(code, native, cut, raster_options(printer_name))]}
+    if mode == "logo_text":
+        with job_phase("encode"):
+            text_bytes = encode_printer_text(printer_name, content, codepage)
+        storage = logo_storage(printer_name)
+        if storage:
+            stored = escpos_with_stored_logo(printer_name, storage, logo or logo_url, text_bytes, bool(logo_url))
+            if stored is not None:
+                return dict(stored, doc="LogoTextJob")
+        chunks = iter_escpos_with_logo(logo or logo_url, content, is_url=bool(logo_url), text_bytes=text_bytes,
+                                       raster=raster_options(printer_name))
+        return {"doc": "LogoTextJob", "chunks": chunks if stream else list(chunks)}
+    return {"path": _write_temp_file(content, ".pdf" if mode == "pdf" else ".jpg")}
+
+def spool_job(printer_name, rendered, copies=1, pages=None):
+    """Print a rendered job; returns warnings.
+
+    Copies of RAW jobs repeat the rendered buffer inside one spool document,
+    after the job's one-off `setup` bytes (stored logo uploads).
+    """
+    if "chunks" in rendered:
+        chunks = rendered["chunks"]
+        setup = rendered.get("setup") or b""
+        try:
+            window = coalesce_window(printer_name, chunks, copies)
+            if window:
+                spool_coalesced(printer_name, setup + b"".join(chunks) * copies, rendered["doc"], *window)
+            else:
+                if copies > 1:
+                    chunks = itertools.chain.from_iterable(itertools.repeat(chunks, copies))
+                if setup:
+                    chunks = itertools.chain((setup,), chunks)
+                _spool_chunks(printer_name, chunks, rendered["doc"])
+        except Exception:
+            if "logo" in rendered:
+                forget_stored_logos(printer_name)  # A download upload may have been cut short
+            raise
+        if "logo" in rendered:
+            remember_stored_logo(*rendered["logo"])
+        return []
+    return _print_file(printer_name, rendered["path"], copies, pages)
+
+def discard_job(rendered):
+    """Clean up after a rendered job"""
+    if rendered and "path" in rendered and not rendered.get("cached"):
+        schedule_remove(rendered["path"])
+
+# ===========================================
+# 🔹 Job coalescing (small RAW jobs per printer)
+# ===========================================
+COALESCE_DEFAULT_BYTES = 16 * 1024
+COALESCE_DEFAULT_JOBS = 32
+
+coalesce_batches = {}       # printer name -> batch still accepting jobs
+coalesce_stats = Counter()  # jobs, documents, coalesced (jobs that shared a document)
+coalesce_lock = threading.Lock()
+
+class _Batch:
+    """Jobs merged into one spool document; the first job waits out the window and writes it"""
+    def __init__(self, data, limit, max_jobs):
+        self.parts = [data]
+        self.size = len(data)
+        self.limit = limit
+        self.max_jobs = max_jobs
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.error = None
+
+def coalesce_window(printer_name, chunks, copies=1):
+    """(window seconds, byte limit, job limit) when a RAW job may be coalesced, else None.
+
+    Opt-in per printer with the profile option "coalesce_ms"; only small,
+    already rendered jobs qualify ("coalesce_bytes", "coalesce_jobs").
+    """
+    profile = get_printer_profile(printer_name)
+    ms = profile.get("coalesce_ms")
+    if not ms or not isinstance(chunks, list):
+        return None
+    limit = int(profile.get("coalesce_bytes") or COALESCE_DEFAULT_BYTES)
+    if sum(len(c) for c in chunks) * copies > limit:
+        return None
+    return float(ms) / 1000, limit, int(profile.get("coalesce_jobs") or COALESCE_DEFAULT_JOBS)
+
+def spool_coalesced(printer_name, data, doc_name, window, limit, max_jobs):
+    """Print `data`, merged with other jobs for the printer arriving within `window`.
+
+    Every caller returns (or raises) once the shared document is written, so
+    each still gets its own result.
+    """
+    with coalesce_lock:
+        batch = coalesce_batches.get(printer_name)
+        if batch is not None and batch.size + len(data) <= batch.limit:
+            batch.parts.append(data)
+            batch.size += len(data)
+            leader = False
+            if batch.size >= batch.limit or len(batch.parts) >= batch.max_jobs:
+                del coalesce_batches[printer_name]
+                batch.full.set()
+        else:
+            if batch is not None:
+                # Does not fit: let the open batch go now and start a new one
+                del coalesce_batches[printer_name]
+                batch.full.set()
+            batch = coalesce_batches[printer_name] = _Batch(data, limit, max_jobs)
+            leader = True
+
+    if not leader:
+        with job_phase("coalesce"):
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return
+
+    with job_phase("coalesce"):
+        batch.full.wait(window)
+    with coalesce_lock:
+        if coalesce_batches.get(printer_name) is batch:
+            del coalesce_batches[printer_name]
+        parts = batch.parts
     try:
-        win32print.StartDocPrinter(h, 1, ("RawPrintJob", None, "RAW"))
-        win32print.StartPagePrinter(h)
-        win32print.WritePrinter(h, data)
-        win32print.EndPagePrinter(h)
-        win32print.EndDocPrinter(h)
+        _spool_chunks(printer_name, parts, doc_name if len(parts) == 1 else "CoalescedJob")
+    except Exception as e:
+        batch.error = e
+        raise
     finally:
-        win32print.ClosePrinter(h)
+        with coalesce_lock:
+            coalesce_stats["jobs"] += len(parts)
+            coalesce_stats["documents"] += 1
+            if len(parts) > 1:
+                coalesce_stats["coalesced"] += len(parts)
+        batch.done.set()
+
+def coalesce_snapshot():
+    """Coalescing counters for the status API"""
+    with coalesce_lock:
+        jobs = coalesce_stats["jobs"]
+        return {
+            "jobs": jobs,
+            "documents": coalesce_stats["documents"],
+            "coalesced": coalesce_stats["coalesced"],
+            "rate": round(coalesce_stats["coalesced"] / jobs, 4) if jobs else 0.0
+        }
 
-def _print_file(printer_name, path):
-    win32api.ShellExecute(0, "printto", path, f'"{printer_name}"', ".", 0)
+# ===========================================
+# 🔹 Admission control (/print backpressure)
+# ===========================================
+ADMISSION_DEFAULTS = {
+    "max_request_mb": 50,      # Larger bodies are refused with 413 before they are read
+    "client_rate": 20,         # Sustained jobs/second per client address
+    "client_burst": 40,        # Jobs a client may send at once before being limited
+    "max_inflight_jobs": 32,   # Jobs being processed at once, across all clients
+    "max_inflight_mb": 200     # Request bytes being processed at once
+}
+CLIENT_BUCKETS_MAX = 4096
+
+admission_limits = dict(ADMISSION_DEFAULTS)
+client_buckets = {}        # client address -> [tokens, last refill (monotonic)]
+inflight = {"jobs": 0, "bytes": 0}
+admission_rejects = Counter()
+admission_lock = threading.Lock()
+
+def load_admission_limits():
+    """Load admission limits from configuration over the defaults"""
+    global admission_limits
+    limits = dict(ADMISSION_DEFAULTS)
+    try:
+        for name, value in json.loads(get_config().get("limits") or "{}").items():
+            if name in limits:
+                limits[name] = float(value)
+    except Exception as e:
+        print(f"Error loading admission limits: {e}")
+    with admission_lock:
+        admission_limits = limits
+        client_buckets.clear()
+    app.config["MAX_CONTENT_LENGTH"] = int(limits["max_request_mb"] * 1024 * 1024)
+
+def _reject(reason, code, message, retry_after=None):
+    with admission_lock:
+        admission_rejects[reason] += 1
+    response = jsonify({"error": message})
+    response.status_code = code
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
 
-def _print_pdf(printer_name, pdf_data):
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    if pdf_data.startswith("http"):
-        r = requests.get(pdf_data)
-        tmp.write(r.content)
-    else:
-        tmp.write(base64.b64decode(pdf_data))
-    tmp.close()
-    _print_file(printer_name, tmp.name)
-    schedule_remove(tmp.name)
-
-def _print_image(printer_name, img_data):
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    if img_data.startswith("http"):
-        r = requests.get(img_data)
-        tmp.write(r.content)
-    else:
-        tmp.write(base64.b64decode(img_data))
-    tmp.close()
-    _print_file(printer_name, tmp.name)
-    schedule_remove(tmp.name)
+def admit_job():
+    """Admit a /print request: (job bytes, None) or (None, rejection response).
+
+    Checks, cheapest first: body size, the client's token bucket, then the
+    jobs and bytes already in flight. Jobs forwarded by a peer skip the bucket:
+    the peer already charged the original client, and all its clients would
+    otherwise share the peer's address. Admitted jobs must call release_job().
+    """
+    limits = admission_limits
+    size = request.content_length or 0
+    if size > limits["max_request_mb"] * 1024 * 1024:
+        return None, _reject("too_large", 413, f"Request larger than {limits['max_request_mb']:g} MB")
+
+    client = None if forwarded_by_peer() else request.remote_addr or ""
+    now = time.monotonic()
+    with admission_lock:
+        bucket = None
+        if client is not None:
+            bucket = client_buckets.get(client)
+            if bucket is None:
+                if len(client_buckets) >= CLIENT_BUCKETS_MAX:
+                    client_buckets.clear()  # Idle clients only cost a fresh burst allowance
+                bucket = client_buckets[client] = [limits["client_burst"], now]
+            bucket[0] = min(limits["client_burst"], bucket[0] + (now - bucket[1]) * limits["client_rate"])
+            bucket[1] = now
+        if bucket is not None and bucket[0] < 1:
+            wait = (1 - bucket[0]) / limits["client_rate"] if limits["client_rate"] else 60
+            rate_limited = True
+        elif (inflight["jobs"] + 1 > limits["max_inflight_jobs"]
+                # A single job over the byte limit still runs when nothing else is in flight
+                or inflight["bytes"] + size > limits["max_inflight_mb"] * 1024 * 1024 and inflight["jobs"]):
+            rate_limited = False
+        else:
+            if bucket is not None:
+                bucket[0] -= 1
+            inflight["jobs"] += 1
+            inflight["bytes"] += size
+            return size, None
+
+    if rate_limited:
+        return None, _reject("rate_limited", 429, "Too many print jobs from this client", wait)
+    return None, _reject("overloaded", 503, "Print server busy, retry shortly", 1)
+
+def release_job(size):
+    with admission_lock:
+        inflight["jobs"] -= 1
+        inflight["bytes"] -= size
+
+def admission_snapshot():
+    """Limits, current load and rejection counts for the status API"""
+    with admission_lock:
+        return {
+            "limits": dict(admission_limits),
+            "inflight_jobs": inflight["jobs"],
+            "inflight_bytes": inflight["bytes"],
+            "rejected": {k: admission_rejects[k] for k in ("too_large", "rate_limited", "overloaded")}
+        }
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """Bodies over MAX_CONTENT_LENGTH that were sent without a Content-Length"""
+    return _reject("too_large", 413, "Request too large")
+
+# ===========================================
+# 🔹 Streaming /print bodies
+# ===========================================
+STREAM_BODY_THRESHOLD = 256 * 1024   # Smaller bodies are parsed in one go
+STREAM_READ_SIZE = 64 * 1024
+STREAM_MEMORY_LIMIT = 1024 * 1024    # Spooled temp files move to disk beyond this
+STREAM_BINARY_MODES = {"raw": None, "pdf": ".pdf", "image": ".jpg"}  # base64 `data` -> temp file suffix
+
+JSON_SPACE = re.compile(r"[ \t\n\r]*")
+JSON_STRING_BODY = re.compile(r'[^"\\]*(?:\\(?:u[0-9a-fA-F]{4}|["\\/bfnrt])[^"\\]*)*')
+JSON_HIGH_SURROGATE = re.compile(r'(?<!\\)(?:\\\\)*\\u[dD][89abAB][0-9a-fA-F]{2}$')  # First half of a pair
+BASE64_JUNK = bytes(sorted(set(range(256)) - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/")))
+
+class StreamedPayload:
+    """Base64 `data` decoded while the request body was read, held in a temp file.
+
+    PDF and image payloads are named files the printing application can open;
+    RAW payloads are spooled in memory up to STREAM_MEMORY_LIMIT. Iterating
+    yields the bytes from the start, so a payload can be spooled repeatedly
+    (copies, pool failover) and by several threads at once (fan-out).
+    """
+    def __init__(self, suffix=None):
+        if suffix:
+            self.file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+            self.path = self.file.name
+        else:
+            self.file = tempfile.SpooledTemporaryFile(max_size=STREAM_MEMORY_LIMIT)
+            self.path = None
+        self.size = 0
+        self.pending = b""
+        self.lock = threading.Lock()  # Readers share the spooled file's position
+
+    def write_base64(self, text):
+        """Decode whole base64 quads; the rest waits for the next piece"""
+        data = self.pending + text.encode("ascii", "ignore").translate(None, BASE64_JUNK)
+        cut = len(data) - len(data) % 4
+        if cut:
+            decoded = binascii.a2b_base64(data[:cut])
+            self.file.write(decoded)
+            self.size += len(decoded)
+        self.pending = data[cut:]
+
+    def finish(self):
+        if self.pending:
+            if len(self.pending) == 1:
+                raise binascii.Error("Incorrect padding")
+            decoded = binascii.a2b_base64(self.pending + b"=" * (-len(self.pending) % 4))
+            self.file.write(decoded)
+            self.size += len(decoded)
+            self.pending = b""
+        if self.path:
+            self.file.close()  # Opened again by name
+        return self
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __iter__(self):
+        if self.path:
+            with open(self.path, "rb") as f:
+                yield from iter(lambda: f.read(STREAM_READ_SIZE), b"")
+            return
+        offset = 0
+        while True:
+            with self.lock:
+                self.file.seek(offset)
+                chunk = self.file.read(STREAM_READ_SIZE)
+            if not chunk:
+                return
+            offset += len(chunk)
+            yield chunk
+
+    def discard(self):
+        self.file.close()
+        if self.path:
+            schedule_remove(self.path)
+
+class _DataSink:
+    """Receives the `data` string piece by piece.
+
+    When the mode was sent before `data` (and the value is not a URL) the
+    base64 is decoded straight into a StreamedPayload; otherwise the string is
+    kept in a spooled temp file and sorted out once the whole body is read.
+    """
+    def __init__(self, mode):
+        self.suffix = STREAM_BINARY_MODES.get(mode, False)
+        self.head = ""
+        self.payload = None
+        self.text = None
+
+    def write(self, piece):
+        if self.payload is None and self.text is None:
+            self.head += piece
+            if len(self.head) < 8:
+                return
+            piece, self.head = self.head, ""
+            if self.suffix is not False and not piece.startswith("http"):
+                self.payload = StreamedPayload(self.suffix)
+            else:
+                self.text = tempfile.SpooledTemporaryFile(max_size=STREAM_MEMORY_LIMIT, mode="w+",
+                                                        encoding="utf-8", newline="")
+        if self.payload is not None:
+            self.payload.write_base64(piece)
+        else:
+            self.text.write(piece)
+
+    def finish(self, mode):
+        """The field's value: a StreamedPayload for binary modes, else the string"""
+        if self.payload is not None:
+            return self.payload.finish()
+        suffix = STREAM_BINARY_MODES.get(mode, False)
+        if self.text is None:
+            text = self.head  # Short value, never left the head buffer
+            if suffix is False or not text or text.startswith("http"):
+                return text
+            payload = StreamedPayload(suffix)
+            payload.write_base64(text)
+            return payload.finish()
+
+        self.text.seek(0)
+        if suffix is False or self.text.read(4) == "http":
+            self.text.seek(0)
+            text = self.text.read()
+            self.text.close()
+            return text
+        self.text.seek(0)
+        payload = StreamedPayload(suffix)
+        for piece in iter(lambda: self.text.read(STREAM_READ_SIZE), ""):
+            payload.write_base64(piece)
+        self.text.close()
+        return payload.finish()
+
+class _JsonStream:
+    """Just enough of an incremental JSON reader for one top-level object"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            raise ValueError("Unexpected end of JSON body")
+        chunk = self.stream.read(STREAM_READ_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def next_char(self):
+        """Skip whitespace and consume one character"""
+        while True:
+            self.pos = JSON_SPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                self.pos += 1
+                return self.buf[self.pos - 1]
+            self.fill()
+
+    def peek_char(self):
+        c = self.next_char()
+        self.pos -= 1
+        return c
+
+    def value(self):
+        """Parse a complete (small) value, reading more of the body as needed"""
+        self.peek_char()
+        while True:
+            try:
+                value, end = json.JSONDecoder().raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            if end == len(self.buf) and not self.eof and self.buf[end - 1] not in '"]}':
+                self.fill()  # A number or literal may continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def stream_string(self, sink):
+        """Feed the string at the cursor to `sink.write` without holding all of it"""
+        if self.next_char() != '"':
+            raise ValueError("Expected a string")
+        while True:
+            quote = self.buf.find('"', self.pos)
+            end = quote if quote >= 0 else len(self.buf)
+            held = False
+            if self.buf.find("\\", self.pos, end) >= 0:
+                end = JSON_STRING_BODY.match(self.buf, self.pos).end()
+                if (end == len(self.buf) or self.buf[end] != '"') and \
+                        JSON_HIGH_SURROGATE.search(self.buf, self.pos, end):
+                    end -= 6  # Decoded together with the low surrogate in the next chunk
+                    held = True
+            piece = self.buf[self.pos:end]
+            if "\\" in piece:
+                piece = json.loads(f'"{piece}"')
+            if piece:
+                sink.write(piece)
+            self.pos = end
+            if end < len(self.buf) and self.buf[end] == '"':
+                self.pos += 1
+                return
+            if len(self.buf) - end >= (12 if held else 6):
+                raise ValueError("Invalid escape in string")
+            self.fill()  # The string, or an escape sequence, continues in the next chunk
+
+def parse_print_stream(stream):
+    """Parse a /print JSON object, streaming the `data` field; returns the fields"""
+    reader = _JsonStream(stream)
+    if reader.next_char() != "{":
+        raise ValueError("Expected a JSON object")
+    fields = {}
+    sink = None
+    if reader.peek_char() == "}":
+        reader.next_char()
+        return fields
+    while True:
+        key = reader.value()
+        if not isinstance(key, str) or reader.next_char() != ":":
+            raise ValueError("Expected a key")
+        if key == "data" and reader.peek_char() == '"':
+            sink = _DataSink(fields.get("mode"))
+            reader.stream_string(sink)
+            fields.pop("data", None)
+        else:
+            fields[key] = reader.value()
+        c = reader.next_char()
+        if c == "}":
+            break
+        if c != ",":
+            raise ValueError("Expected ',' or '}'")
+    if sink is not None and "data" not in fields:
+        fields["data"] = sink.finish(fields.get("mode", "text"))
+    return fields
+
+def read_print_body():
+    """The /print JSON object; `data` may be a StreamedPayload. Raises on bad JSON.
+
+    Bodies from STREAM_BODY_THRESHOLD up (or of unknown length) are parsed as
+    they arrive, so a large base64 payload never sits in memory as a whole.
+    """
+    size = request.content_length
+    if size is not None and size < STREAM_BODY_THRESHOLD:
+        return request.get_json(force=True)
+    return parse_print_stream(request.stream)
 
 # ===========================================
 # 🔹 Print endpoint
 # ===========================================
+MAX_COPIES = 99
+PAGE_RANGES = re.compile(r"^\d+(-\d+)?(,\d+(-\d+)?)*$")
+
+def publish_job(printer_name, mode, status, error=None, pool=None):
+    """Announce a finished print job on the live status stream"""
+    publish_event("job", {
+        "time": datetime.now().isoformat(),
+        "printer": printer_name,
+        "mode": mode,
+        "pool": pool,
+        "status": status,
+        "error": error
+    })
+
 @app.route("/print", methods=["POST"])
 def print_job():
+    size, rejected = admit_job()
+    if rejected:
+        return rejected
+    job = begin_job()
+    want_timings = request.args.get("timings") == "true"
+    code = 500
     try:
-        data = request.get_json(force=True)
-    except Exception:
-        return jsonify({"error": "Invalid JSON"}), 400
+        result, code = _handle_print(job)
+        want_timings = want_timings or job.pop("want_timings", False)
+    finally:
+        if "payload" in job:
+            job.pop("payload").discard()
+        finish_job(job, "ok" if code == 200 else "error")
+        release_job(size)
+    if want_timings:
+        result["timings"] = job_summary(job)
+    return jsonify(result), code
+
+def _handle_print(job):
+    """Run one /print request; returns (response body, HTTP status)"""
+    with job_phase("parse"):
+        try:
+            data = read_print_body()
+        except binascii.Error as e:
+            return {"error": f"Invalid base64 in 'data': {e}"}, 400
+        except Exception:
+            data = None
+    if not isinstance(data, dict):
+        return {"error": "Invalid JSON"}, 400
+    if isinstance(data.get("data"), StreamedPayload):
+        job["payload"] = data["data"]
 
     printer_id = data.get("printer")
     mode = data.get("mode", "text")
     content = data.get("data")
     logo = data.get("logo")
     logo_url = data.get("logo_url")
+    codepage = data.get("codepage")
+    job["mode"] = mode
+    job["want_timings"] = bool(data.get("timings"))
 
     if not printer_id or not content:
-        return jsonify({"error": "Missing printer or data"}), 400
+        return {"error": "Missing printer or data"}, 400
 
+    pool = None
+    targets = None
+    if isinstance(printer_id, list):
+        try:
+            check_targets(printer_id)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+    elif not isinstance(printer_id, str):
+        return {"error": "'printer' must be a printer name or Id, pool:<name>, or a list of printers"}, 400
     try:
-        printer_name = resolve_printer(printer_id)
+        with job_phase("resolve"):
+            if isinstance(printer_id, list):
+                targets = resolve_targets(printer_id, peers=PEER_FORWARD_HEADER not in request.headers)
+            elif printer_id.startswith(POOL_PREFIX):
+                pool = printer_id[len(POOL_PREFIX):]
+                _resolve_pool(pool)
+            else:
+                printer_name, peer = resolve_target(printer_id, peers=PEER_FORWARD_HEADER not in request.headers)
     except Exception as e:
-        return jsonify({"error": str(e)}), 404
-
+        return {"error": str(e)}, 404
+    if pool is None and targets is None and peer:
+        job["printer"] = f"{printer_id}@{peer}"
+        return forward_print(peer, data)
+
+    if mode not in ("text", "raw", "pdf", "image", "logo_text", "qr", "barcode", "document"):
+        return {"error": "Invalid mode"}, 400
+    if mode == "document":
+        if not isinstance(content, list):
+            return {"error": "'data' must be a list of elements in document mode"}, 400
+    elif not isinstance(content, str) and not (mode in ("raw", "pdf", "image") and isinstance(content, StreamedPayload)):
+        return {"error": f"'data' must be a string in {mode} mode"}, 400
+    for name, value in (("logo", logo), ("logo_url", logo_url)):
+        if value is not None and not isinstance(value, str):
+            return {"error": f"'{name}' must be a string"}, 400
+    code = None
     try:
-        if mode == "text":
-            _print_text(printer_name, content)
-        elif mode == "raw":
-            _print_raw(printer_name, content)
-        elif mode == "pdf":
-            _print_pdf(printer_name, content)
-        elif mode == "image":
-            _print_image(printer_name, content)
-        elif mode == "logo_text":
-            if not logo and not logo_url:
-                return jsonify({"error": "Missing 'logo' or 'logo_url'"}), 400
-            combined = build_escpos_with_logo(logo or logo_url, content, is_url=bool(logo_url))
-            _print_raw(printer_name, combined)
+        if mode in ("qr", "barcode"):
+            code = code_spec(mode, content, data)
+        elif mode == "document":
+            code = parse_document(content)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    paper = data.get("paper")
+    dpi = data.get("dpi")
+    try:
+        if paper is not None:
+            parse_paper(paper)
+            paper = str(paper).strip().lower()
+        if dpi is not None:
+            check_dpi(dpi)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    render = data.get("render")
+    if render is not None and render not in ("native", "raster"):
+        return {"error": "'render' must be \"native\" or \"raster\""}, 400
+    native = {"native": True, "raster": False}.get(render)
+    if code is not None and native is not True:
+        # Rasterised when asked to, or by any printer the job may go to that has no native codes
+        if pool is not None:
+            printers = _resolve_pool(pool)
         else:
-            return jsonify({"error": "Invalid mode"}), 400
+            printers = [t[1] for t in targets if t[1]] if targets is not None else [printer_name]
+        if native is False or any(not get_printer_profile(p).get("native_codes", True) for p in printers):
+            try:
+                check_raster_codes(mode, code)
+            except ValueError as e:
+                return {"error": str(e)}, 400
+    cut = data.get("cut", True) is not False
+    if mode == "logo_text" and not logo and not logo_url:
+        return {"error": "Missing 'logo' or 'logo_url'"}, 400
+    if codepage is not None and not isinstance(codepage, str):
+        return {"error": "'codepage' must be a string, e.g. \"cp858\""}, 400
+    if codepage and codepage not in ESCPOS_CODEPAGES and codepage not in ("utf-8", "utf8"):
+        return {"error": f"Unsupported codepage '{codepage}'"}, 400
+    copies = data.get("copies", 1)
+    if not isinstance(copies, int) or isinstance(copies, bool) or not 1 <= copies <= MAX_COPIES:
+        return {"error": f"'copies' must be a whole number between 1 and {MAX_COPIES}"}, 400
+    pages = data.get("pages")
+    if pages is not None:
+        pages = str(pages).replace(" ", "")
+        if not PAGE_RANGES.match(pages):
+            return {"error": "Invalid 'pages', expected e.g. \"1-3,5\""}, 400
+        if mode != "pdf":
+            pages = None  # Page ranges only apply to PDF jobs
+
+    if targets is not None:
+        return print_fan_out(job, targets, data, mode, content, copies, pages, dict(
+            logo=logo, logo_url=logo_url, codepage=codepage, code=code, native=native, cut=cut, paper=paper, dpi=dpi))
+
+    rendered = None
+    try:
+        if pool is None:
+            job["printer"] = printer_name
+            acquire_printer(printer_name)
+            try:
+                rendered = render_job(printer_name, mode, content, logo, logo_url, codepage,
+                                      stream=copies == 1, code=code, native=native, cut=cut,
+                                      paper=paper, dpi=dpi)
+                warnings = spool_job(printer_name, rendered, copies, pages)
+            except Exception as e:
+                publish_job(printer_name, mode, "error", str(e))
+                return {"error": str(e)}, 500
+            finally:
+                release_printer(printer_name)
+            publish_job(printer_name, mode, "ok")
+            return _print_result(printer_name, mode, copies, warnings), 200
+
+        # Pool target: least-loaded online member, failing over on spooler errors.
+        # The job is rendered once, for the first member tried.
+        tried = []
+        last_error = None
+        while True:
+            with job_phase("resolve"):
+                printer_name = acquire_pool_member(pool, exclude=tried)
+            if printer_name is None:
+                error = f"No available printer in pool '{pool}'"
+                if last_error:
+                    error += f" (last error: {last_error})"
+                publish_job(None, mode, "error", error, pool)
+                return {"error": error, "tried": tried}, 503
+            tried.append(printer_name)
+            job["printer"] = printer_name
+            try:
+                if rendered is None or rendered.get("logo", (printer_name,))[0] != printer_name:
+                    # Stored logos are rendered for the printer that holds them
+                    discard_job(rendered)
+                    rendered = render_job(printer_name, mode, content, logo, logo_url, codepage,
+                                          code=code, native=native, cut=cut, paper=paper, dpi=dpi)
+                warnings = spool_job(printer_name, rendered, copies, pages)
+                break
+            except pywintypes.error as e:
+                print(f"⚠️ Pool '{pool}': {printer_name} failed ({e}), failing over")
+                mark_printer_offline(printer_name)
+                last_error = str(e)
+            except Exception as e:
+                publish_job(printer_name, mode, "error", str(e), pool)
+                return {"error": str(e)}, 500
+            finally:
+                release_printer(printer_name)
+
+        publish_job(printer_name, mode, "ok", pool=pool)
+        result = _print_result(printer_name, mode, copies, warnings)
+        result["pool"] = pool
+        return result, 200
+    finally:
+        discard_job(rendered)
+
+def _print_result(printer_name, mode, copies, warnings):
+    result = {"status": "ok", "printer": printer_name, "mode": mode, "copies": copies}
+    if warnings:
+        result["warnings"] = warnings
+    return result
+
+# ===========================================
+# 🔹 Fan-out (one job, several printers)
+# ===========================================
+FANOUT_MAX_PRINTERS = 16
+
+fanout_executor = None
+fanout_lock = threading.Lock()
+
+def check_targets(identifiers):
+    """Validate a `printer` list; raises ValueError"""
+    if not identifiers or len(identifiers) > FANOUT_MAX_PRINTERS:
+        raise ValueError(f"'printer' lists take 1 to {FANOUT_MAX_PRINTERS} printers")
+    for identifier in identifiers:
+        if not isinstance(identifier, str):
+            raise ValueError(f"'printer' list items must be strings, got {type(identifier).__name__}")
+        if identifier.startswith(POOL_PREFIX):
+            raise ValueError("'printer' lists take printer names or Ids, not pools")
+
+def resolve_targets(identifiers, peers=True):
+    """[(identifier, local printer name, peer)] for a checked `printer` list; raises ValueError"""
+    targets = []
+    for identifier in dict.fromkeys(identifiers):
+        try:
+            targets.append((identifier, *resolve_target(identifier, peers)))
+        except ValueError:
+            raise ValueError(f"Printer not found: {identifier}")
+    return targets
+
+def get_fanout_executor():
+    global fanout_executor
+    with fanout_lock:
+        if fanout_executor is None:
+            fanout_executor = concurrent.futures.ThreadPoolExecutor(FANOUT_MAX_PRINTERS,
+                                                                    thread_name_prefix="fanout")
+        return fanout_executor
+
+def _spool_target(job, printer_name, rendered, copies, pages):
+    """Spool one fan-out target on a worker thread, timed as part of the request's job"""
+    job_context.job = job
+    acquire_printer(printer_name)
+    try:
+        warnings = spool_job(printer_name, rendered, copies, pages)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        publish_job(printer_name, job["mode"], "error", str(e))
+        return {"printer": printer_name, "status": "error", "error": str(e)}
+    finally:
+        release_printer(printer_name)
+        job_context.job = None
+    publish_job(printer_name, job["mode"], "ok")
+    return _print_result(printer_name, job["mode"], copies, warnings)
 
-    return jsonify({"status": "ok", "printer": printer_name, "mode": mode})
+def _forward_target(job, identifier, peer, data):
+    job_context.job = job
+    try:
+        result, code = forward_print(peer, dict(data, printer=identifier))
+    finally:
+        job_context.job = None
+    if code != 200:
+        result = dict(result, status="error", printer=result.get("printer", identifier))
+    return result
+
+def print_fan_out(job, targets, data, mode, content, copies, pages, render_args):
+    """Render a job once per distinct printer profile and spool it to every target in parallel.
+
+    Returns per-printer results: 200 when all printed, 207 when some did,
+    500 when none did.
+    """
+    job["printer"] = ",".join(name or f"{ident}@{peer}" for ident, name, peer in targets)
+    renders = {}   # Printer profile -> rendered job, shared by printers rendered alike
+    all_rendered = []
+    futures = []
+    executor = get_fanout_executor()
+    try:
+        for identifier, printer_name, peer in targets:
+            if peer:
+                futures.append(executor.submit(_forward_target, job, identifier, peer, data))
+                continue
+            key = json.dumps(get_printer_profile(printer_name), sort_keys=True, default=str)
+            rendered = renders.get(key)
+            if rendered is None:
+                try:
+                    rendered = render_job(printer_name, mode, content, **render_args)
+                except Exception as e:
+                    publish_job(printer_name, mode, "error", str(e))
+                    futures.append({"printer": printer_name, "status": "error", "error": str(e)})
+                    continue
+                all_rendered.append(rendered)
+                if "logo" not in rendered:  # Stored logos are rendered for each printer
+                    renders[key] = rendered
+            futures.append(executor.submit(_spool_target, job, printer_name, rendered, copies, pages))
+        with job_phase("fan-out"):
+            results = [f if isinstance(f, dict) else f.result() for f in futures]
+    finally:
+        for f in futures:
+            if not isinstance(f, dict):
+                f.result()  # Files stay until every spool is done with them
+        for rendered in all_rendered:
+            discard_job(rendered)
+    ok = sum(1 for r in results if r.get("status") == "ok")
+    status = "ok" if ok == len(results) else "partial" if ok else "error"
+    return {"status": status, "mode": mode, "copies": copies, "results": results}, \
+        200 if status == "ok" else 207 if ok else 500
+
+# ===========================================
+# 🔹 Sampling profiler (/debug/profile)
+# ===========================================
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 120
+PROFILE_DEFAULT_RATE = 100   # Samples per second
+PROFILE_MAX_RATE = 1000
+
+profile_lock = threading.Lock()
+
+def debug_allowed():
+    """Debug endpoints answer loopback clients, or any client with the configured token"""
+    token = get_config().get("debug_token") or ""
+    supplied = request.headers.get("X-Debug-Token") or request.args.get("token") or ""
+    if token and supplied:
+        return hmac.compare_digest(token, supplied)
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+def sample_stacks(seconds, rate):
+    """Sample every other thread's Python stack `rate` times per second.
+
+    Returns (Counter of (thread id, frames root-first) -> samples, sample rounds).
+    Frame labels are cached per code object so each round costs little more
+    than sys._current_frames().
+    """
+    me = threading.get_ident()
+    labels = {}
+    stacks = Counter()
+    rounds = 0
+    interval = 1.0 / rate
+    deadline = time.monotonic() + seconds
+    next_sample = time.monotonic()
+    while next_sample < deadline:
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                parts.append(label)
+                frame = frame.f_back
+            parts.reverse()
+            stacks[(ident, tuple(parts))] += 1
+        frames = frame = None  # Drop frame references between samples
+        rounds += 1
+        next_sample += interval
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.monotonic()  # Fell behind: skip rather than burst
+    return stacks, rounds
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    """Profile all threads for `seconds`; returns collapsed stacks and top functions"""
+    if not debug_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        seconds = min(max(request.args.get("seconds", PROFILE_DEFAULT_SECONDS, type=float), 0.1), PROFILE_MAX_SECONDS)
+        rate = min(max(request.args.get("rate", PROFILE_DEFAULT_RATE, type=int), 1), PROFILE_MAX_RATE)
+        top = max(request.args.get("top", 20, type=int), 1)
+    except Exception:
+        return jsonify({"error": "Invalid 'seconds', 'rate' or 'top'"}), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        started = time.perf_counter()
+        stacks, rounds = sample_stacks(seconds, rate)
+        elapsed = time.perf_counter() - started
+    finally:
+        profile_lock.release()
+
+    names = {t.ident: t.name for t in threading.enumerate()}
+    collapsed = Counter()
+    self_counts = Counter()
+    total_counts = Counter()
+    for (ident, parts), count in stacks.items():
+        collapsed[";".join((names.get(ident, f"thread-{ident}"),) + parts)] += count
+        if parts:
+            self_counts[parts[-1]] += count
+        for label in set(parts):
+            total_counts[label] += count
+    lines = "\n".join(f"{stack} {count}" for stack, count in collapsed.most_common())
+
+    if request.args.get("format") == "collapsed":
+        return Response(lines + "\n", mimetype="text/plain")
+    samples = sum(stacks.values()) or 1
+    return jsonify({
+        "seconds": round(elapsed, 3),
+        "rate": rate,
+        "rounds": rounds,
+        "samples": sum(stacks.values()),
+        "top_self": [{"function": f, "samples": c, "percent": round(100 * c / samples, 2)}
+                     for f, c in self_counts.most_common(top)],
+        "top_total": [{"function": f, "samples": c, "percent": round(100 * c / samples, 2)}
+                      for f, c in total_counts.most_common(top)],
+        "collapsed": lines
+    })
 
 # ===========================================
 # 🔹 API Documentation Endpoint
@@ -1370,23 +4332,63 @@ DOCS_HTML = """
             </div>
         </div>
 
+        <div class="endpoint-card">
+            <div class="endpoint-header">
+                <span class="method-badge method-get">GET</span>
+                <span class="path">/printers/watch?since=&lt;version&gt;&amp;timeout=30</span>
+            </div>
+            <div class="description">
+                Long-poll for printer changes. Without <code>since</code> it returns the current <code>version</code> and <code>printers</code> at once.
+                With <code>since</code> it waits (up to <code>timeout</code> seconds, max 120) until printers are added, removed or changed, or the default
+                printer changes, then returns <code>version</code>, <code>added</code>, <code>removed</code>, <code>updated</code> and the new <code>default</code>.
+                On timeout <code>changed</code> is false; <code>reset: true</code> means the version was too old and the full list is returned instead.
+            </div>
+        </div>
+
+        <div class="endpoint-card">
+            <div class="endpoint-header">
+                <span class="method-badge method-get">GET</span>
+                <span class="path">/peers</span>
+            </div>
+            <div class="description">
+                Other printlink instances this one forwards to: the <code>peers</code> configuration value (a list of <code>host:port</code>) plus, with
+                <code>peer_discovery</code> set to <code>true</code>, instances announcing themselves on UDP port 9199. <code>/printers?scope=all</code> lists their printers
+                too, each with its <code>Peer</code>; <code>/print</code> jobs for them are forwarded and the response names the <code>peer</code>. Start with <code>--port</code> to run several instances on one host.
+            </div>
+        </div>
+
         <div class="endpoint-card">
             <div class="endpoint-header">
                 <span class="method-badge method-post">POST</span>
                 <span class="path">/print</span>
             </div>
             <div class="description">
-                Send a print job to the specified printer. Use the 8-character **Id** from the list above.
+                Send a print job to the specified printer. Use the 8-character **Id** from the list above,
+                or <code>pool:&lt;name&gt;</code> to route the job to the least-loaded online printer of a configured pool.
+                A list of up to 16 printers (<code>"printer": ["Kitchen", "Bar", "Expo"]</code>) prints the job on all of them at once, rendered once per printer profile;
+                the response has one entry per printer in <code>results</code> and is <code>200</code> when all printed, <code>207</code> when some did and <code>500</code> when none did.
+                Oversized bodies get <code>413</code>; clients over their rate get <code>429</code> and, when too many jobs or bytes are in flight, <code>503</code>, both with <code>Retry-After</code>.
+                Limits are set with the <code>limits</code> configuration value.
+                Image jobs sent with <code>"paper": "4x6"</code> (or a4, letter, <code>&lt;w&gt;x&lt;h&gt;</code> inches) and optional <code>"dpi"</code>, or for printers whose profile sets
+                <code>image_paper</code>/<code>image_dpi</code>, are downscaled, turned upright and stripped of metadata before printing; reprints reuse the prepared file.
+                Set the profile option <code>"elide_blank_rows": true</code> to send white rows of raster logos and codes as paper feeds, with <code>"feed_units_per_dot"</code> when the printer's ESC J unit is finer than a dot row (2 on a TM-T88),
+                and <code>"trim_raster": true</code> to drop white space at the right edge. <code>"timings": true</code> reports the bytes this saved.
+                Printers whose profile sets <code>"coalesce_ms"</code> merge small text and raw jobs arriving within that many milliseconds into one spool document
+                (up to <code>"coalesce_bytes"</code>, default 16384, and <code>"coalesce_jobs"</code>, default 32); each request still gets its own response.
+                With the profile option <code>"logo_storage": "nv"</code> (or <code>"download"</code>), <code>logo_text</code> logos are uploaded to the printer's graphics memory once
+                and then printed by key; they are uploaded again when the logo changes, and download logos also after a spooler error or when the printer comes back online.
+                Text for <code>text</code> and <code>logo_text</code> is encoded with the printer's ESC/POS code pages; send <code>"codepage": "cp858"</code> to force one page or <code>"utf-8"</code> to send UTF-8.
             </div>
             <div class="content-grid">
                 <div class="content-section">
                     <h3>Request Body (JSON)</h3>
                     <div class="code-block" id="code2">
                         {
-  "type": "raw",
+  "printer": "f4e5a9c0",
+  "mode": "raw",
   "data": "b3MxMjM...", // Base64 encoded RAW printer commands (e.g., ESC/POS)
-  "pages": "1-3,5", // Optional: Page range for file/PDF printing
-  "copies": 1 // Optional
+  "pages": "1-3,5", // Optional: Page range for PDF printing (needs SumatraPDF.exe)
+  "copies": 1 // Optional: 1-99, rendered once and repeated
 }
                         <button class="copy-btn" onclick="copyCode('code2', this)">Copy</button>
                     </div>
@@ -1398,6 +4400,12 @@ DOCS_HTML = """
                         <li style="margin-bottom: 5px;"><code style="background-color: #EEE; padding: 2px 4px; border-radius: 3px;">file</code>: Base64 encoded PDF or image data, or a URL to a file.</li>
                         <li><code style="background-color: #EEE; padding: 2px 4px; border-radius: 3px;">text</code>: Plain text (will be printed as a simple text document).</li>
                         <li><code style="background-color: #EEE; padding: 2px 4px; border-radius: 3px;">text</code>: Logo text (will be printed as a simple text document with logo send logo_url body param with base64 or image link).</li>
+                        <li style="margin-top: 5px;"><code style="background-color: #EEE; padding: 2px 4px; border-radius: 3px;">qr</code> / <code style="background-color: #EEE; padding: 2px 4px; border-radius: 3px;">barcode</code>: <code>data</code> is the content. QR takes <code>size</code> (1-16) and <code>ec</code> (L/M/Q/H); barcodes take <code>symbology</code> (CODE128, EAN13, UPCA, ...), <code>height</code>, <code>width</code> and <code>hri</code>. Printed with native printer commands, or as an image with <code>"render": "raster"</code> or the profile option <code>"native_codes": false</code> (not CODE93 or UPCE, which get <code>400</code>).</li>
+                        <li style="margin-top: 5px;"><code style="background-color: #EEE; padding: 2px 4px; border-radius: 3px;">document</code>: <code>data</code> is a list of elements, each with a <code>type</code>:
+                            <code>text</code> (<code>text</code>, <code>align</code>, <code>bold</code>, <code>underline</code>, <code>width</code>/<code>height</code> 1-8, <code>font</code> a/b, <code>invert</code>),
+                            <code>columns</code> (<code>columns</code>: list of <code>{text, width, align}</code>, same styles), <code>rule</code> (<code>char</code>), <code>feed</code> (<code>lines</code>),
+                            <code>cut</code> (<code>feed</code>, <code>partial</code>), <code>image</code> (<code>data</code> base64 or <code>url</code>, <code>align</code>) and <code>qr</code>/<code>barcode</code> (options as above, plus <code>align</code>).
+                            Line width comes from the profile option <code>"columns"</code> (default 48).</li>
                     </ul>
                 </div>
             </div>
@@ -1409,7 +4417,7 @@ DOCS_HTML = """
                 <span class="path">/api/status</span>
             </div>
             <div class="description">
-                Get the current running status, PID, and last error of the internal Vortex service.
+                Get the current running status, PID, and last error of the internal Vortex service, plus <code>admission</code>: print limits, jobs and bytes in flight, and rejection counts, and <code>coalescing</code>: jobs, spool documents and the share of jobs merged.
             </div>
             <div class="content-grid">
                 <div class="content-section" style="border-right: none;">
@@ -1428,6 +4436,66 @@ DOCS_HTML = """
             </div>
         </div>
 
+        <div class="endpoint-card">
+            <div class="endpoint-header">
+                <span class="method-badge method-get">GET</span>
+                <span class="path">/api/status/logs?since=&lt;seq&gt;&amp;limit=200</span>
+            </div>
+            <div class="description">
+                Captured Vortex stdout/stderr, oldest first. Without <code>since</code> the last <code>limit</code> lines are returned; pass <code>next</code> back as <code>since</code> to page forward.
+            </div>
+            <div class="content-grid">
+                <div class="content-section" style="border-right: none;">
+                    <h3>Example Response</h3>
+                    <div class="code-block" id="code4">
+                        {
+  "entries": [
+    {"seq": 41, "time": "2025-11-02T18:00:01.120000", "stream": "stdout", "line": "connected"}
+  ],
+  "first": 1,
+  "next": 41,
+  "more": false,
+  "truncated": false
+}
+                        <button class="copy-btn" onclick="copyCode('code4', this)">Copy</button>
+                    </div>
+                </div>
+            </div>
+        </div>
+
+        <div class="endpoint-card">
+            <div class="endpoint-header">
+                <span class="method-badge method-get">GET</span>
+                <span class="path">/api/jobs/timings?limit=50&amp;format=trace</span>
+            </div>
+            <div class="description">
+                Phase timings (parse, resolve, decode, fetch, render, open, write, end...) of recent <code>/print</code> jobs in milliseconds.
+                Send <code>"timings": true</code> with a print job to get its own timings in the response. <code>format=trace</code> returns
+                Chrome trace-event JSON; start the server with <code>--trace-file trace.json</code> to record every job to a file.
+            </div>
+        </div>
+
+        <div class="endpoint-card">
+            <div class="endpoint-header">
+                <span class="method-badge method-get">GET</span>
+                <span class="path">/debug/profile?seconds=10&amp;rate=100&amp;top=20</span>
+            </div>
+            <div class="description">
+                Samples every thread's stack while requests keep being served and returns the top functions plus collapsed stacks for flame graphs
+                (<code>format=collapsed</code> returns only the collapsed text). Only answers localhost, or clients sending the configured <code>X-Debug-Token</code>.
+            </div>
+        </div>
+
+        <div class="endpoint-card">
+            <div class="endpoint-header">
+                <span class="method-badge method-get">GET</span>
+                <span class="path">/api/status/stream</span>
+            </div>
+            <div class="description">
+                Server-Sent Events stream. Sends a <code>snapshot</code> on connect, then <code>status</code> (changed Vortex fields only), <code>log</code>, <code>job</code> and <code>printer</code> events as they happen.
+            </div>
+        </div>
+
 
     </div>
 
@@ -1451,14 +4519,13 @@ DOCS_HTML = """
 </body>
 </html>
 """
+with startup_phase("render docs page"):
+    DOCS_PAGE = static_page(app.jinja_env.from_string(DOCS_HTML).render())
+
 @app.route("/api/docs", methods=["GET"])
 def api_docs():
     """API Documentation"""
-    config = get_config()
-    base_url = f"https://{config.get('site')}" if config.get('site') else "http://localhost:9100"
-    
-
-    return render_template_string(DOCS_HTML)
+    return static_page_response(DOCS_PAGE)
 
 # ===========================================
 # 🔹 Auto-run vortex (background thread)
@@ -1478,7 +4545,7 @@ def run_vortex():
     if not vortex_path:
         update_vortex_status(running=False, error="vortex.exe not found")
         print("❌ Vortex.exe not found. Print server will run without vortex.")
-        print("   Visit http://localhost:9100/config to configure when vortex.exe is available.")
+        print(f"   Visit http://localhost:{HTTP_PORT}/config to configure when vortex.exe is available.")
         return
 
     while not flask_shutdown:
@@ -1491,7 +4558,7 @@ def run_vortex():
         # Wait for configuration
         while not is_configured() and not flask_shutdown:
             update_vortex_status(running=False, error="Waiting for configuration")
-            print("⏳ Waiting for configuration... Visit http://localhost:9100/config")
+            print(f"⏳ Waiting for configuration... Visit http://localhost:{HTTP_PORT}/config")
             time.sleep(5)
         
         if flask_shutdown:
@@ -1519,7 +4586,11 @@ def run_vortex():
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             startupinfo.wShowWindow = 0  # SW_HIDE
             
-            vortex_process = subprocess.Popen(cmd, shell=False, startupinfo=startupinfo)
+            vortex_process = subprocess.Popen(
+                cmd, shell=False, startupinfo=startupinfo,
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            start_vortex_readers(vortex_process)
             
             update_vortex_status(running=True, error=None, pid=vortex_process.pid)
             print(f"✓ Vortex started with PID: {vortex_process.pid} (running silently)\n")
@@ -1571,10 +4642,38 @@ def run_vortex():
             print("Restarting vortex in 5 seconds...\n")
             time.sleep(5)
 
+# ===========================================
+# 🔹 Startup profile report
+# ===========================================
+def report_startup_profile(port):
+    """Time the first /api/status answer and print every startup phase"""
+    import urllib.request
+    t = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/status", timeout=30) as r:
+            r.read()
+        startup_phases.append(("first /api/status response", time.perf_counter() - t))
+    except Exception as e:
+        print(f"⚠️ Startup profile: /api/status did not answer ({e})")
+    ready = time.perf_counter() - startup_t0
+
+    print("\n" + "=" * 60)
+    print("⏱️  Startup Profile")
+    print("=" * 60)
+    for name, seconds in startup_phases:
+        print(f"   {seconds * 1000:9.1f} ms  {name}")
+    print(f"   {ready * 1000:9.1f} ms  total until /api/status answered")
+    lazy = [m for m in ("PIL", "requests", "win32api") if m in sys.modules]
+    print(f"   Lazy modules already loaded: {', '.join(lazy) or 'none'}")
+    print(f"   Vortex discovery finished: {vortex_status['last_error'] is not None or vortex_status['running']}")
+    print("=" * 60 + "\n")
+
 # ===========================================
 # 🔹 Start both services
 # ===========================================
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Raster pool workers in the frozen exe
+    register_cleanup_handlers()
     print("=" * 60)
     print("🖨️  Professional Print Server - Enterprise Edition")
     print("=" * 60)
@@ -1592,27 +4691,47 @@ if __name__ == "__main__":
     print(f"   - Password: {'*' * len(FIXED_PASSWORD)} (configured in script)")
     
     print(f"\n🌐 Access Points:")
-    print(f"   ⚙️  Configuration: http://localhost:9100/config")
-    print(f"   📊 Status Monitor: http://localhost:9100/status")
-    print(f"   📋 Printer List:   http://localhost:9100/")
-    print(f"   📚 API Docs:       http://localhost:9100/api/docs")
+    print(f"   ⚙️  Configuration: http://localhost:{HTTP_PORT}/config")
+    print(f"   📊 Status Monitor: http://localhost:{HTTP_PORT}/status")
+    print(f"   📋 Printer List:   http://localhost:{HTTP_PORT}/")
+    print(f"   📚 API Docs:       http://localhost:{HTTP_PORT}/api/docs")
     
     print(f"\n⚠️  Important Notes:")
-    print(f"   - Flask server: 0.0.0.0:9100 (accepts external connections)")
+    print(f"   - Flask server: 0.0.0.0:{HTTP_PORT} (accepts external connections)")
     print(f"   - Set Host to '0.0.0.0' in config for external vortex access")
     print(f"   - Password is hardcoded in script for security")
     print(f"   - Use Stop Service button or Ctrl+C to shutdown")
     print("=" * 60 + "\n")
     
-    # Start vortex monitoring thread
-    threading.Thread(target=run_vortex, daemon=True).start()
-    
-    # Run Flask server
+    with startup_phase("load configuration"):
+        load_pools()
+        load_printer_profiles()
+        load_admission_limits()
+
+    # Run Flask server: bind first so /api/status answers while background
+    # work (vortex discovery, network lookups) is still starting up
     try:
-        app.run(host="0.0.0.0", port=9100, debug=False)
+        with startup_phase(f"bind 0.0.0.0:{HTTP_PORT}"):
+            from werkzeug.serving import make_server
+            server = make_server("0.0.0.0", HTTP_PORT, app, threaded=True)
+        print(f"✓ Listening on 0.0.0.0:{HTTP_PORT}")
+
+        with startup_phase("start background threads"):
+            start_network_refresher()
+            load_peers()
+            # Start vortex monitoring thread
+            threading.Thread(target=run_vortex, daemon=True).start()
+
+        if "--trace-file" in sys.argv[:-1]:
+            open_trace_file(sys.argv[sys.argv.index("--trace-file") + 1])
+
+        if STARTUP_PROFILE:
+            threading.Thread(target=report_startup_profile, args=(HTTP_PORT,), daemon=True).start()
+
+        server.serve_forever()
     except KeyboardInterrupt:
         print("\n\nReceived shutdown signal...")
         stop_all_services()
     except Exception as e:
         print(f"\nFlask error: {e}")
-        stop_all_services()
\ No newline at end of file
+        stop_all_services()
@@ -0,0 +1,12 @@
+"""Run the tests against the simulated spooler when pywin32 is not installed."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FAKE_PRINTER_BPS", "0")
+os.environ.setdefault("FAKE_SPOOLER_LATENCY_MS", "0")
+try:
+    import win32print  # noqa: F401
+except ImportError:
+    import fake_spooler
+    fake_spooler.install()
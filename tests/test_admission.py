@@ -0,0 +1,43 @@
+"""Per-client rate limits and jobs forwarded by peers."""
+import pytest
+
+import printlink
+
+
+@pytest.fixture
+def one_job_per_client(monkeypatch):
+    monkeypatch.setattr(printlink, "admission_limits", dict(printlink.ADMISSION_DEFAULTS, client_rate=0.001, client_burst=1))
+    monkeypatch.setattr(printlink, "peer_registry", {"10.0.0.2:9100": {"instance": "peer1", "printers": []}})
+    printlink.client_buckets.clear()
+    yield
+    printlink.client_buckets.clear()
+
+
+def admit(headers=None, address="10.0.0.2"):
+    with printlink.app.test_request_context("/print", method="POST", headers=headers or {},
+                                            environ_base={"REMOTE_ADDR": address}):
+        size, rejected = printlink.admit_job()
+        if rejected is not None:
+            return rejected.status_code
+        printlink.release_job(size)
+        return 200
+
+
+def test_client_over_its_rate_gets_429(one_job_per_client):
+    assert [admit(), admit()] == [200, 429]
+
+
+def test_jobs_forwarded_by_a_peer_skip_the_client_bucket(one_job_per_client):
+    forwarded = {printlink.PEER_FORWARD_HEADER: "peer1"}
+    assert [admit(forwarded) for _ in range(3)] == [200, 200, 200]
+    assert admit() == 200
+
+
+def test_unknown_forwarder_is_limited_like_any_client(one_job_per_client):
+    spoofed = {printlink.PEER_FORWARD_HEADER: "someone"}
+    assert [admit(spoofed), admit(spoofed)] == [200, 429]
+
+
+def test_known_peer_id_from_another_address_is_limited(one_job_per_client):
+    borrowed = {printlink.PEER_FORWARD_HEADER: "peer1"}
+    assert [admit(borrowed, "10.0.0.9"), admit(borrowed, "10.0.0.9")] == [200, 429]
@@ -0,0 +1,69 @@
+"""Barcode validation, encoding and the raster fallback."""
+import pytest
+
+import printlink
+
+
+def post(body):
+    r = printlink.app.test_client().post("/print", json=dict({"printer": "Receipt"}, **body))
+    return r.status_code, r.get_json()
+
+
+@pytest.mark.parametrize("body", [
+    {"mode": "barcode", "data": "ABC-1", "symbology": "CODE93", "render": "raster"},
+    {"mode": "barcode", "data": "123456", "symbology": "UPCE", "render": "raster"},
+    {"mode": "document", "data": [{"type": "barcode", "data": "ABC", "symbology": "CODE93"}], "render": "raster"},
+])
+def test_raster_only_request_is_a_400(body):
+    status, result = post(body)
+    assert status == 400
+    assert "native printer commands" in result["error"]
+
+
+def test_printer_without_native_codes_is_a_400(monkeypatch):
+    monkeypatch.setattr(printlink, "get_printer_profile", lambda name: {"native_codes": False})
+    status, result = post({"mode": "barcode", "data": "ABC-1", "symbology": "CODE93"})
+    assert status == 400
+
+
+@pytest.mark.parametrize("body", [
+    {"mode": "barcode", "data": "ABC-1", "symbology": "CODE93"},
+    {"mode": "barcode", "data": "ABC-1", "symbology": "CODE128", "render": "raster"},
+])
+def test_printable_codes_still_print(body):
+    assert post(body)[0] == 200
+
+
+@pytest.mark.parametrize("content, payload", [
+    ("AB{C", b"{BAB{{C"),
+    ("{A12", b"{B{{A12"),
+    ("plain", b"{Bplain"),
+])
+def test_code128_braces_are_sent_literally(content, payload):
+    out = printlink.escpos_barcode(content)
+    assert out.endswith(b"\x1dk" + bytes([73, len(payload)]) + payload)
+
+
+def test_code128_with_braces_must_fit_the_length_byte():
+    with pytest.raises(ValueError, match="too long"):
+        printlink.code_spec("barcode", "{" * 200, {})
+
+
+@pytest.mark.parametrize("kind, content, options, message", [
+    ("barcode", "123456789", {"symbology": "UPCE"}, "UPCE needs 6-8 digits"),
+    ("barcode", "1234567890", {"symbology": "UPCE"}, "UPCE needs 6-8 digits"),
+    ("qr", "x" * 2954, {}, "too long"),
+    ("qr", "x", {"size": 6.5}, "'size'"),
+    ("qr", "x", {"size": True}, "'size'"),
+    ("qr", "x", {"size": "6"}, "'size'"),
+    ("barcode", "ABC", {"height": False}, "'height'"),
+    ("barcode", "ABC", {"width": 2.0}, "'width'"),
+])
+def test_invalid_code_options(kind, content, options, message):
+    with pytest.raises(ValueError, match=message):
+        printlink.code_spec(kind, content, options)
+
+
+def test_valid_code_options():
+    assert printlink.code_spec("barcode", "12345670", {"symbology": "UPCE", "height": 60})[3] == 60
+    assert printlink.code_spec("qr", "x" * 2953, {"size": 4})[2] == 4
@@ -0,0 +1,58 @@
+"""Validation of `document` print jobs (parse_document)."""
+import json
+
+import pytest
+
+import printlink
+
+
+@pytest.mark.parametrize("element, message", [
+    ({"type": "text", "underline": None}, "'underline'"),
+    ({"type": "text", "underline": "x"}, "'underline'"),
+    ({"type": "text", "align": ["center"]}, "'align'"),
+    ({"type": "text", "width": 9}, "'width'"),
+    ({"type": "columns", "columns": [{"text": "a", "align": ["right"]}]}, "column 'align'"),
+    ({"type": "columns", "columns": [{"text": "a", "width": "5"}]}, "column 'width'"),
+    ({"type": "image", "data": "x", "align": None}, "'align'"),
+    ({"type": "qr", "data": "x", "align": {}}, "'align'"),
+    ({"type": "feed", "lines": None}, "'lines'"),
+    ({"type": "feed", "lines": True}, "'lines'"),
+    ({"type": "text", "width": True}, "'width'"),
+    ({"type": "text", "height": False}, "'height'"),
+    ({"type": "text", "underline": True}, "'underline'"),
+    ({"type": "columns", "columns": [{"text": "a", "width": True}]}, "column 'width'"),
+    ({"type": ["text"]}, "unknown type"),
+])
+def test_bad_elements_are_value_errors(element, message):
+    with pytest.raises(ValueError, match=r"^Element 1: .*" + message):
+        printlink.parse_document([{"type": "text", "text": "ok"}, element])
+
+
+def test_bad_element_is_a_400():
+    r = printlink.app.test_client().post("/print", json={
+        "printer": "Receipt", "mode": "document", "data": [{"type": "text", "underline": None}]})
+    assert r.status_code == 400
+    assert r.get_json()["error"].startswith("Element 0:")
+
+
+def test_styles_only_sent_when_they_change():
+    doc = printlink.parse_document([
+        {"type": "text", "text": "A", "bold": True},
+        {"type": "text", "text": "B", "bold": True},
+        {"type": "text", "text": "C"},
+    ])
+    out = bytes(printlink.compile_document("Receipt", doc))
+    assert out == b"\x1b@\x1bE\x01A\nB\n\x1bE\x00C\n"
+
+
+@pytest.mark.parametrize("columns", ["wide", True, 0, 42.5])
+def test_bad_profile_columns_fall_back_to_the_default(monkeypatch, columns):
+    monkeypatch.setattr(printlink, "get_config", lambda: {"printer_profiles": json.dumps({"Receipt": {"columns": columns}})})
+    printlink.load_printer_profiles()
+    try:
+        assert printlink.printer_profiles == {"Receipt": {}}
+        doc = printlink.parse_document([{"type": "rule"}])
+        assert bytes(printlink.compile_document("Receipt", doc)).count(b"-") == printlink.DOCUMENT_COLUMNS
+    finally:
+        monkeypatch.undo()
+        printlink.load_printer_profiles()
@@ -0,0 +1,41 @@
+"""Prepared (downscaled) images are published whole."""
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+import printlink
+
+
+@pytest.fixture
+def photo(tmp_path, monkeypatch):
+    monkeypatch.setattr(printlink, "image_cache", {})
+    monkeypatch.setattr(printlink, "image_cache_dir", str(tmp_path / "cache"))
+    os.mkdir(printlink.image_cache_dir)
+    path = tmp_path / "photo.png"
+    Image.effect_noise((1600, 1200), 64).convert("RGB").save(path)
+    return str(path)
+
+
+def test_concurrent_jobs_for_one_image_share_a_complete_file(photo):
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(printlink.prepared_image(photo, "4x6", 100)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(paths)) == 1
+    with Image.open(paths[0]) as im:
+        assert im.size == (533, 400)
+        im.load()
+    assert os.listdir(printlink.image_cache_dir) == [os.path.basename(paths[0])]
+
+
+def test_failed_preprocess_leaves_nothing_behind(photo, tmp_path):
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    with pytest.raises(Exception):
+        printlink.prepared_image(str(broken), "4x6", 100)
+    assert os.listdir(printlink.image_cache_dir) == []
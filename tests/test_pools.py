@@ -0,0 +1,63 @@
+"""Pool routing follows the spooler's printer status."""
+import fake_spooler
+import pytest
+
+import printlink
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(printlink, "printer_pools", {"bar": ["Bar", "Kitchen"]})
+    printlink.pool_members.clear()
+    yield "bar"
+    fake_spooler.set_offline("Bar", False)
+    printlink.get_printer_list(0)
+
+
+def acquire(pool):
+    name = printlink.acquire_pool_member(pool)
+    if name:
+        printlink.release_printer(name)
+    return name
+
+
+def test_member_going_offline_is_skipped(pool):
+    printlink.get_printer_list(0)
+    assert acquire(pool) in ("Bar", "Kitchen")
+    fake_spooler.set_offline("Bar")
+    printlink.get_printer_list(0)
+    assert {acquire(pool) for _ in range(3)} == {"Kitchen"}
+    fake_spooler.set_offline("Bar", False)
+    printlink.get_printer_list(0)
+    assert acquire(pool) == "Bar"
+
+
+def test_pool_members_follow_printer_list_changes(pool):
+    printlink.get_printer_list(0)
+    assert printlink._resolve_pool(pool) == ["Bar", "Kitchen"]
+    fake_spooler.remove_printer("Kitchen")
+    try:
+        printlink.get_printer_list(0)
+        assert printlink._resolve_pool(pool) == ["Bar"]
+    finally:
+        fake_spooler.add_printer("Kitchen")
+    printlink.get_printer_list(0)
+    assert printlink._resolve_pool(pool) == ["Bar", "Kitchen"]
+
+
+@pytest.mark.parametrize("printer", [42, {"name": "Bar"}, True])
+def test_printer_of_the_wrong_type_is_a_400(printer):
+    r = printlink.app.test_client().post("/print", json={"printer": printer, "mode": "text", "data": "x"})
+    assert r.status_code == 400
+    assert "'printer' must be" in r.get_json()["error"]
+
+
+@pytest.mark.parametrize("printers, message", [
+    (["Bar", 42], "must be strings, got int"),
+    (["Bar", None], "must be strings, got NoneType"),
+    (["Bar", "pool:bar"], "not pools"),
+])
+def test_bad_printer_list_items_are_a_400(printers, message):
+    r = printlink.app.test_client().post("/print", json={"printer": printers, "mode": "text", "data": "x"})
+    assert r.status_code == 400
+    assert message in r.get_json()["error"]
@@ -0,0 +1,73 @@
+"""Wrongly typed /print fields get a JSON 400, not a 500."""
+import json
+
+import pytest
+
+import printlink
+
+
+def post(body):
+    r = printlink.app.test_client().post("/print", json=dict({"printer": "Receipt", "data": "x"}, **body))
+    return r.status_code, r.get_json()
+
+
+@pytest.mark.parametrize("codepage", [["cp437"], {"cp": 437}, 437])
+def test_codepage_must_be_a_string(codepage):
+    status, result = post({"codepage": codepage})
+    assert status == 400
+    assert "'codepage'" in result["error"]
+
+
+@pytest.mark.parametrize("render", [["raster"], {"raster": True}, "image"])
+def test_render_must_be_native_or_raster(render):
+    status, result = post({"mode": "qr", "render": render})
+    assert status == 400
+    assert "'render'" in result["error"]
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"mode": "text", "data": ["a", "b"]}, "'data' must be a string in text mode"),
+    ({"mode": "raw", "data": {"bytes": "AA=="}}, "'data' must be a string in raw mode"),
+    ({"mode": "qr", "data": 42}, "'data' must be a string in qr mode"),
+    ({"mode": "document", "data": "text"}, "'data' must be a list of elements"),
+    ({"mode": "logo_text", "logo": 5}, "'logo' must be a string"),
+    ({"mode": "logo_text", "logo_url": ["http://x/logo.png"]}, "'logo_url' must be a string"),
+])
+def test_wrongly_typed_content_is_a_400(body, message):
+    status, result = post(body)
+    assert status == 400
+    assert result["error"] == message or result["error"].startswith(message)
+
+
+@pytest.mark.parametrize("copies", [2.7, True, "2", 0, None])
+def test_copies_must_be_a_whole_number(copies):
+    status, result = post({"copies": copies})
+    assert status == 400
+    assert "'copies'" in result["error"]
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"dpi": "300dpi"}, "'dpi' must be a whole number"),
+    ({"dpi": 30}, "'dpi' must be a whole number"),
+    ({"dpi": 300.5}, "'dpi' must be a whole number"),
+    ({"paper": ["4x6"]}, "'paper' must be a string"),
+    ({"paper": "4x"}, "Unknown paper"),
+])
+def test_bad_paper_or_dpi_is_a_400(body, message):
+    status, result = post(dict(body, mode="image"))
+    assert status == 400
+    assert result["error"].startswith(message)
+
+
+def test_bad_profile_image_options_are_dropped_on_load(monkeypatch, capsys):
+    monkeypatch.setattr(printlink, "get_config", lambda: {"printer_profiles": json.dumps(
+        {"Receipt": {"image_paper": "4x6", "image_dpi": "high", "columns": 42},
+         "Label": {"image_paper": 5, "image_dpi": 203}})})
+    printlink.load_printer_profiles()
+    try:
+        assert printlink.printer_profiles == {"Receipt": {"image_paper": "4x6", "columns": 42},
+                                              "Label": {"image_dpi": 203}}
+        assert "'Receipt': ignoring image_dpi" in capsys.readouterr().out
+    finally:
+        monkeypatch.undo()
+        printlink.load_printer_profiles()
@@ -0,0 +1,82 @@
+"""Raster encoding: blank rows as feeds, and the pool streaming the in-thread commands."""
+import concurrent.futures
+import io
+import multiprocessing
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+import printlink
+
+
+@pytest.fixture(scope="module")
+def pool():
+    # Workers import printlink, so they need the simulated spooler as well
+    fake = sys.modules.get("fake_spooler")
+    executor = concurrent.futures.ProcessPoolExecutor(
+        1, mp_context=multiprocessing.get_context("spawn"),
+        initializer=fake.install if fake else None)
+    yield executor
+    executor.shutdown()
+
+
+def receipt_png(width=576, height=1500):
+    im = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(im)
+    for y in range(0, height, 300):
+        draw.rectangle((20, y, width - 20, y + 120), fill=0)
+    buf = io.BytesIO()
+    im.save(buf, "PNG")
+    return buf.getvalue(), im.size
+
+
+@pytest.mark.parametrize("elide,trim", [(False, False), (True, False), (True, True)])
+def test_pooled_bands_match_in_thread(pool, elide, trim):
+    data, size = receipt_png()
+    expected = list(printlink.raster_bands(printlink.to_raster_image(Image.open(io.BytesIO(data))), 64, elide, trim))
+    # Ring room for 4 bands of 64 rows: the worker has to wait for the reader
+    assert [bytes(b) for b in printlink.pooled_raster_bands(pool, data, size, 64, elide, trim)] == \
+        [bytes(b) for b in expected]
+
+
+def test_closing_early_releases_the_worker(pool):
+    data, size = receipt_png()
+    bands = printlink.pooled_raster_bands(pool, data, size, 32)
+    next(bands)
+    bands.close()
+    # The cancelled worker returns, so the single worker can take the next job
+    assert len(list(printlink.pooled_raster_bands(pool, data, size, 32))) > 1
+
+
+def test_bad_image_fails_before_returning(pool):
+    data, size = receipt_png()
+    with pytest.raises(Exception):
+        printlink.pooled_raster_bands(pool, data[:200], size)
+
+
+def test_no_pool_on_one_cpu(monkeypatch):
+    monkeypatch.setattr(printlink.os, "cpu_count", lambda: 1)
+    monkeypatch.setattr(printlink, "get_config", lambda: {"raster_workers": "4"})
+    assert printlink.raster_pool_size() == 0
+
+
+def gap_image(gap):
+    im = Image.new("1", (64, 2 + gap), 1)
+    im.putpixel((0, 0), 0)
+    im.putpixel((0, gap + 1), 0)
+    return im
+
+
+@pytest.mark.parametrize("units,feeds", [(1, [255, 45]), (2, [255, 255, 90])])
+def test_blank_rows_feed_in_motion_units(units, feeds):
+    out = b"".join(printlink.raster_bands(gap_image(300), 256, units))
+    assert [out[i + 2] for i in range(len(out) - 2) if out[i:i + 2] == b"\x1bJ"] == feeds
+
+
+def test_blank_rows_are_sent_unless_the_profile_opts_in(monkeypatch):
+    monkeypatch.setattr(printlink, "get_printer_profile", lambda name: {})
+    assert printlink.raster_options("Bar")["elide"] is False
+    monkeypatch.setattr(printlink, "get_printer_profile",
+                        lambda name: {"elide_blank_rows": True, "feed_units_per_dot": 2})
+    assert printlink.raster_options("Bar")["elide"] == 2
@@ -0,0 +1,46 @@
+"""Stored logos are uploaded again only when the printer can have lost them."""
+import io
+
+import pytest
+from PIL import Image
+
+import printlink
+
+
+@pytest.fixture
+def logo():
+    printlink.stored_logos.clear()
+    buf = io.BytesIO()
+    Image.new("1", (64, 16), 0).save(buf, "PNG")
+    yield buf.getvalue()
+    printlink.stored_logos.clear()
+
+
+def uploads(storage, logo):
+    setup, _ = printlink.stored_logo_commands("Bar", storage, logo)
+    return bool(setup)
+
+
+def printed(storage, logo):
+    printlink.remember_stored_logo("Bar", storage, logo)
+
+
+@pytest.mark.parametrize("storage,again", [("nv", False), ("download", True)])
+def test_reset_or_failed_job_forgets_only_download_logos(logo, storage, again):
+    assert uploads(storage, logo)
+    printed(storage, logo)
+    assert not uploads(storage, logo)
+    printlink.forget_stored_logos("Bar")
+    assert uploads(storage, logo) is again
+
+    printed(storage, logo)
+    offline = {"Name": "Bar", "Status": printlink.PRINTER_STATUS_OFFLINE, "Attributes": 0}
+    printlink.forget_reset_printers([offline], [dict(offline, Status=0)])
+    assert uploads(storage, logo) is again
+
+
+def test_changed_nv_logo_is_rewritten(logo):
+    printed("nv", logo)
+    buf = io.BytesIO()
+    Image.new("1", (64, 16), 1).save(buf, "PNG")
+    assert uploads("nv", buf.getvalue())
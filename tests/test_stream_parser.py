@@ -0,0 +1,133 @@
+"""Incremental /print body parser (parse_print_stream) against json.loads."""
+import base64
+import binascii
+import io
+import json
+import os
+import random
+
+import pytest
+
+import printlink
+
+
+class TrickleStream(io.BytesIO):
+    """Returns reads of random small sizes so every value crosses chunk boundaries"""
+    def __init__(self, data, seed=0, max_read=7):
+        super().__init__(data)
+        self.rng = random.Random(seed)
+        self.max_read = max_read
+
+    def read(self, size=-1):
+        return super().read(self.rng.randint(1, self.max_read))
+
+
+def parse(body, **kwargs):
+    fields = printlink.parse_print_stream(TrickleStream(json.dumps(body).encode("utf-8"), **kwargs))
+    if isinstance(fields.get("data"), printlink.StreamedPayload):
+        fields["data"] = b"".join(fields["data"])
+    return fields
+
+
+TEXTS = [
+    "plain receipt line\n" * 20,
+    'quotes " and backslashes \\ and slashes / \t\r\n\b\f',
+    "Café crème brûlée, Smørrebrød, Борщ",
+    "emoji 😀🍕🧾 need surrogate pairs " * 10,
+    "\\ud83d is not an escape here 😀",
+]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("text", TEXTS)
+def test_text_survives_chunk_boundaries(text, seed):
+    body = {"printer": "Receipt", "mode": "text", "data": text}
+    assert parse(body, seed=seed) == body
+
+
+def test_escaped_surrogate_pair_split_across_reads():
+    # json.dumps writes emoji as 😀; cut the body inside and between the two escapes
+    body = json.dumps({"mode": "text", "data": "x😀" * 50}).encode("ascii")
+    for read_size in range(1, 14):
+        stream = io.BytesIO(body)
+        stream.read = lambda size=-1, s=stream, n=read_size: io.BytesIO.read(s, n)
+        assert printlink.parse_print_stream(stream)["data"] == "x😀" * 50
+
+
+def test_unicode_escapes_and_solidus():
+    raw = b'{"mode": "text", "data": "caf\\u00e9 \\/ \\"x\\" \\\\n"}'
+    assert printlink.parse_print_stream(TrickleStream(raw))["data"] == json.loads(raw)["data"]
+
+
+@pytest.mark.parametrize("mode", ["raw", "pdf", "image"])
+def test_base64_payload_mode_first(mode):
+    payload = bytes(range(256)) * 40
+    fields = parse({"mode": mode, "printer": "Receipt", "data": base64.b64encode(payload).decode()})
+    assert fields["data"] == payload
+
+
+def test_data_before_mode():
+    payload = os.urandom(5000)
+    fields = parse({"data": base64.b64encode(payload).decode(), "mode": "raw", "printer": "Receipt"})
+    assert fields["data"] == payload
+    text = parse({"data": "hello 😀", "mode": "text"})
+    assert text["data"] == "hello 😀"
+
+
+def test_base64_with_line_breaks():
+    payload = os.urandom(3000)
+    encoded = base64.encodebytes(payload).decode()  # 76-character lines
+    assert parse({"mode": "raw", "data": encoded})["data"] == payload
+
+
+def test_url_data_stays_a_string():
+    assert parse({"mode": "image", "data": "https://example.com/a.png"})["data"] == "https://example.com/a.png"
+
+
+def test_other_fields_and_nesting():
+    body = {"printer": ["Kitchen", "Bar"], "mode": "document", "copies": 2,
+            "data": [{"type": "text", "text": "a 😀", "bold": True}, {"type": "cut"}]}
+    assert parse(body) == body
+
+
+@pytest.mark.parametrize("bad", ["QUJD" * 10 + "Q", "Q"])
+def test_bad_base64_raises_binascii_error(bad):
+    with pytest.raises(binascii.Error):
+        parse({"mode": "raw", "data": bad})
+    with pytest.raises(binascii.Error):
+        parse({"data": bad, "mode": "raw"})
+
+
+@pytest.mark.parametrize("raw", [b'{"mode": "text", "data": "unterminated', b'{"mode" "text"}', b'[1, 2]',
+                                 b'{"data": "bad \\x escape"}'])
+def test_malformed_json_raises(raw):
+    with pytest.raises(ValueError):
+        printlink.parse_print_stream(TrickleStream(raw))
+
+
+# ===========================================
+# 🔹 Through /print
+# ===========================================
+@pytest.fixture
+def client():
+    return printlink.app.test_client()
+
+
+def large_body(**fields):
+    """Pads with spaces so the body is over STREAM_BODY_THRESHOLD and gets streamed"""
+    body = json.dumps(fields)
+    return body[:-1] + " " * printlink.STREAM_BODY_THRESHOLD + "}"
+
+
+def test_large_text_with_emoji_prints(client):
+    text = "Pizza 🍕 x1\n" * 30000  # Over 256 KB of escapes
+    r = client.post("/print", data=json.dumps({"printer": "Receipt", "mode": "text", "data": text,
+                                               "codepage": "utf-8"}), content_type="application/json")
+    assert r.status_code == 200, r.get_json()
+
+
+def test_large_bad_base64_is_reported_as_base64(client):
+    r = client.post("/print", data=large_body(printer="Receipt", mode="raw", data="QUJD" * 10 + "Q"),
+                    content_type="application/json")
+    assert r.status_code == 400
+    assert "base64" in r.get_json()["error"]